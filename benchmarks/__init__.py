@@ -0,0 +1,12 @@
+# benchmarks/__init__.py
+"""
+Synthetic-load benchmarks for the data layer and the handlers.
+
+Run from the repository root:
+
+    python -m benchmarks.run --users 1000000 --promotions 100000 --claims 10000000 --output bench.json
+
+The synthetic database is built once per size and reused by later runs (pass
+--rebuild to regenerate it). Results are written as JSON so runs from
+different commits can be diffed or plotted.
+"""
@@ -0,0 +1,146 @@
+# benchmarks/fake_api.py
+"""
+Local stand-in for the Telegram Bot API.
+
+Point the bot at it with config.BOT_API_BASE_URL = 'http://127.0.0.1:8081/bot'
+and any BOT_TOKEN. Updates are fed in with push_update() and handed out through
+getUpdates long polling. Every other call is recorded and answered with a
+minimal valid result after an optional artificial latency. Send-type calls can
+be refused with 429 at random (error_rate) or once they exceed a global
+messages-per-second budget (flood_limit), the way Telegram does.
+
+Calls that address a chat are also delivered to per-chat reply queues, which
+is how the load generator sees the bot's responses.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qsl
+
+from httpserver import HTTPServer, Response
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Bench Bot', 'username': 'bench_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+SEND_METHODS = {'sendMessage', 'copyMessage', 'sendPhoto', 'editMessageText', 'forwardMessage'}
+RETRY_AFTER = 1  # seconds suggested in injected 429 responses
+
+
+class FakeBotAPI:
+    """Bot API emulator with update injection, latency and 429 injection."""
+
+    def __init__(self, host='127.0.0.1', port=8081, latency=0.0, jitter=0.0, error_rate=0.0, flood_limit=0):
+        self.http = HTTPServer(self.handle, host, port)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_limit = flood_limit
+        self.calls = Counter()
+        self.throttled = 0
+        self.connected = asyncio.Event()  # set by the bot's first getUpdates
+        self._updates = deque()
+        self._update_id = 0
+        self._new_updates = asyncio.Event()
+        self._replies = {}  # chat_id -> asyncio.Queue of (method, params, timestamp)
+        self._message_id = 0
+        self._window = (0, 0)  # (second, sends in that second)
+
+    # --- Update injection ---
+
+    def push_update(self, payload):
+        """Queues an update (without update_id) for the bot. Returns the assigned update_id."""
+        self._update_id += 1
+        self._updates.append(dict(payload, update_id=self._update_id))
+        self._new_updates.set()
+        return self._update_id
+
+    def watch(self, chat_id):
+        """Starts collecting calls addressed to `chat_id`; returns their queue."""
+        return self._replies.setdefault(chat_id, asyncio.Queue())
+
+    async def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset: self._updates.popleft()
+        if not self._updates:
+            self._new_updates.clear()
+            try: await asyncio.wait_for(self._new_updates.wait(), float(params.get('timeout') or 0))
+            except asyncio.TimeoutError: pass
+        limit = int(params.get('limit') or 100)
+        return [update for _, update in zip(range(limit), self._updates)]
+
+    # --- HTTP ---
+
+    @staticmethod
+    def _params(request):
+        content_type = request.headers.get('content-type', '')
+        if content_type.startswith('application/json'): return json.loads(request.body or b'{}')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return dict(parse_qsl(request.body.decode(), keep_blank_values=True))
+        return dict(request.query)
+
+    def _flooded(self):
+        if not self.flood_limit: return False
+        second = int(time.monotonic())
+        start, count = self._window
+        if second != start: count = 0
+        self._window = (second, count + 1)
+        return count >= self.flood_limit
+
+    async def handle(self, request):
+        method = request.path.rsplit('/', 1)[-1]
+        params = self._params(request)
+        if method == 'getUpdates':
+            self.connected.set()
+            return self._ok(await self._get_updates(params))
+        self.calls[method] += 1
+        if self.latency or self.jitter: await asyncio.sleep(self.latency + random.random() * self.jitter)
+        if method in SEND_METHODS and (self._flooded() or random.random() < self.error_rate):
+            self.throttled += 1
+            return self._json({'ok': False, 'error_code': 429, 'description': f'Too Many Requests: retry after {RETRY_AFTER}',
+                               'parameters': {'retry_after': RETRY_AFTER}}, status=429)
+        chat_id = params.get('chat_id')
+        if chat_id is None and method == 'answerCallbackQuery':
+            chat_id = params.get('callback_query_id', '').split(':')[0]  # ids are issued as "<chat_id>:<n>"
+        if chat_id not in (None, '') and int(chat_id) in self._replies:
+            self._replies[int(chat_id)].put_nowait((method, params, time.perf_counter()))
+        return self._ok(self._result(method, params))
+
+    def _result(self, method, params):
+        chat_id = int(params['chat_id']) if params.get('chat_id') not in (None, '') else 0
+        if method == 'getMe': return BOT_USER
+        if method in ('sendMessage', 'sendPhoto', 'editMessageText', 'forwardMessage'):
+            self._message_id += 1
+            chat = {'id': chat_id, 'type': 'private'} if chat_id > 0 else {'id': chat_id, 'type': 'supergroup', 'title': 'Group'}
+            message = {'message_id': self._message_id, 'date': int(time.time()), 'from': BOT_USER, 'chat': chat}
+            if 'text' in params: message['text'] = params['text']
+            if 'caption' in params: message['caption'] = params['caption']
+            if method == 'editMessageText' and 'message_id' in params: message['message_id'] = int(params['message_id'])
+            return message
+        if method == 'copyMessage':
+            self._message_id += 1
+            return {'message_id': self._message_id}
+        if method == 'getChat':
+            return {'id': chat_id, 'type': 'channel', 'title': f'Channel {chat_id}', 'invite_link': f'https://t.me/+bench{abs(chat_id)}',
+                    'accent_color_id': 0, 'max_reaction_count': 11}
+        if method == 'getChatMember':
+            user_id = int(params['user_id'])
+            status = 'administrator' if user_id == BOT_USER['id'] else 'member'
+            member = {'status': status, 'user': {'id': user_id, 'is_bot': user_id == BOT_USER['id'], 'first_name': f'User {user_id}'}}
+            if status == 'administrator':
+                member.update(can_be_edited=False, is_anonymous=False, can_manage_chat=True, can_delete_messages=True,
+                              can_manage_video_chats=True, can_restrict_members=True, can_promote_members=False,
+                              can_change_info=True, can_invite_users=True, can_post_stories=False,
+                              can_edit_stories=False, can_delete_stories=False)
+            return member
+        if method == 'createChatInviteLink':
+            return {'invite_link': f'https://t.me/+bench{abs(chat_id)}', 'creator': BOT_USER, 'creates_join_request': False,
+                    'is_primary': False, 'is_revoked': False}
+        return True
+
+    @staticmethod
+    def _json(payload, status=200):
+        return Response(status, json.dumps(payload), content_type='application/json')
+
+    def _ok(self, result):
+        return self._json({'ok': True, 'result': result})
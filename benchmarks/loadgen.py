@@ -0,0 +1,192 @@
+# benchmarks/loadgen.py
+"""
+Replays synthetic users against the real bot through the fake Bot API.
+
+Start the load generator first, then the bot with
+config.BOT_API_BASE_URL = 'http://127.0.0.1:8081/bot' (polling mode):
+
+    python -m benchmarks.loadgen --users 2000 --concurrency 200 --output e2e.json
+    python main.py
+
+Once the bot's first getUpdates arrives, the generator adds the bot to
+--groups groups as admin, then runs every user through these flows:
+
+  start    /start
+  tasks    Earn Credits, then Claim or Verify on the task shown
+  promote  set a normal link via the conversation, then Group Share
+
+With --admin-id, that admin also queues one broadcast to every user at the
+start of the run. Each step's latency runs from injecting the update to the
+first bot call that answers it. The report covers per-step latency
+percentiles, overall update throughput, Bot API call counts and the number of
+429s injected.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from benchmarks.fake_api import BOT_USER, FakeBotAPI
+from benchmarks.stats import git_commit, summarize
+
+FIRST_USER_ID = 5000000000
+REPLY_TIMEOUT = 30  # seconds to wait for the bot's answer to a step
+FLOWS = ('start', 'tasks', 'promote')
+
+
+class LoadGenerator:
+    """Simulated users clicking through the bot, one coroutine per user."""
+
+    def __init__(self, api, flows=FLOWS):
+        self.api = api
+        self.flows = flows
+        self.latencies = {}  # step name -> [seconds]
+        self.timeouts = {}
+        self.updates = 0
+        self._callback_ids = 0
+        self._date = int(time.time())
+
+    # --- Update payloads ---
+
+    @staticmethod
+    def _user(user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'Load {user_id}', 'username': f'load{user_id}'}
+
+    def _message(self, user_id, **fields):
+        message = {'message_id': 1, 'date': self._date, 'chat': {'id': user_id, 'type': 'private', 'first_name': f'Load {user_id}'},
+                   'from': self._user(user_id)}
+        message.update(fields)
+        return {'message': message}
+
+    def text(self, user_id, text):
+        fields = {'text': text}
+        if text.startswith('/'): fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self._message(user_id, **fields)
+
+    def button(self, user_id, data):
+        self._callback_ids += 1
+        return {'callback_query': {'id': f'{user_id}:{self._callback_ids}', 'from': self._user(user_id), 'chat_instance': str(user_id),
+                                   'data': data, 'message': {'message_id': 1, 'date': self._date, 'from': BOT_USER,
+                                                             'chat': {'id': user_id, 'type': 'private'}, 'text': 'menu'}}}
+
+    def bot_added(self, group_id, adder_id):
+        return {'message': {'message_id': 1, 'date': self._date, 'chat': {'id': group_id, 'type': 'supergroup', 'title': f'Group {group_id}'},
+                            'from': self._user(adder_id), 'new_chat_members': [BOT_USER]}}
+
+    # --- Steps ---
+
+    async def step(self, name, replies, chat_id, payload, accept):
+        """Sends `payload` and waits for a reply call satisfying `accept(method, params)`. Returns its params or None."""
+        while not replies.empty(): replies.get_nowait()  # drop late answers to earlier steps
+        started = time.perf_counter()
+        self.api.push_update(payload)
+        self.updates += 1
+        deadline = started + REPLY_TIMEOUT
+        while True:
+            try:
+                method, params, answered = await asyncio.wait_for(replies.get(), max(0.0, deadline - time.perf_counter()))
+            except asyncio.TimeoutError:
+                self.timeouts[name] = self.timeouts.get(name, 0) + 1
+                return None
+            if accept(method, params):
+                self.latencies.setdefault(name, []).append(answered - started)
+                return params
+
+    async def run_user(self, user_id):
+        replies = self.api.watch(user_id)
+        sent = lambda *methods: (lambda method, params: method in methods)
+        alert_or = lambda *methods: (lambda method, params: method in methods or (method == 'answerCallbackQuery' and params.get('text')))
+        if 'start' in self.flows:
+            await self.step('start', replies, user_id, self.text(user_id, '/start'), sent('sendMessage'))
+        if 'tasks' in self.flows:
+            params = await self.step('earn_credits', replies, user_id, self.button(user_id, 'earn_credits'), sent('editMessageText'))
+            data = _task_button(params)
+            if data: await self.step('claim', replies, user_id, self.button(user_id, data), alert_or('editMessageText'))
+        if 'promote' in self.flows:
+            if await self.step('set_link', replies, user_id, self.button(user_id, 'set_normal_link'), sent('sendMessage')):
+                await self.step('link_text', replies, user_id, self.text(user_id, f'Load test promotion {user_id}'), sent('sendMessage'))
+                await self.step('link_url', replies, user_id, self.text(user_id, f'https://example.com/{user_id}'), sent('sendMessage'))
+                await self.step('group_share', replies, user_id, self.button(user_id, 'group_share'), alert_or('editMessageText'))
+
+    async def run_admin_broadcast(self, admin_id):
+        replies = self.api.watch(admin_id)
+        if await self.step('admin_broadcast', replies, admin_id, self.button(admin_id, 'admin_broadcast'), lambda m, p: m == 'sendMessage'):
+            await self.step('broadcast_queued', replies, admin_id, self.text(admin_id, 'Load test broadcast'), lambda m, p: m == 'sendMessage')
+
+
+def _task_button(params):
+    """The Claim/Verify callback data in a task screen's keyboard, if any."""
+    if not params or not params.get('reply_markup'): return None
+    markup = params['reply_markup']
+    if isinstance(markup, str): markup = json.loads(markup)
+    for row in markup.get('inline_keyboard', []):
+        for button in row:
+            data = button.get('callback_data') or ''
+            if data.startswith(('claim_', 'verify_')): return data
+    return None
+
+
+async def run(args):
+    api = FakeBotAPI(args.host, args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                     error_rate=args.error_rate, flood_limit=args.flood_limit)
+    await api.http.start()
+    print(f"Fake Bot API listening on http://{args.host}:{api.http.port}/bot<token>/; waiting for the bot...", file=sys.stderr)
+    await api.connected.wait()
+
+    generator = LoadGenerator(api, flows=args.flows or FLOWS)
+    for n in range(args.groups):
+        api.push_update(generator.bot_added(-1002000000000 - n, FIRST_USER_ID))
+    await asyncio.sleep(args.settle)
+
+    users = iter(range(FIRST_USER_ID, FIRST_USER_ID + args.users))
+    calls_before = sum(api.calls.values())
+
+    async def worker():
+        for user_id in users: await generator.run_user(user_id)
+
+    started = time.perf_counter()
+    tasks = [worker() for _ in range(args.concurrency)]
+    if args.admin_id: tasks.append(generator.run_admin_broadcast(args.admin_id))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(args.settle)  # let trailing fan-out reach the API before counting calls
+    await api.http.stop()
+
+    return {'meta': {'commit': git_commit(), 'users': args.users, 'concurrency': args.concurrency, 'groups': args.groups,
+                     'latency_ms': args.latency, 'jitter_ms': args.jitter, 'error_rate': args.error_rate, 'flood_limit': args.flood_limit},
+            'updates': generator.updates,
+            'elapsed_s': elapsed,
+            'updates_per_sec': generator.updates / elapsed if elapsed else 0.0,
+            'steps': {name: summarize(values, elapsed) for name, values in generator.latencies.items()},
+            'timeouts': generator.timeouts,
+            'api_calls': dict(api.calls),
+            'api_calls_during_run': sum(api.calls.values()) - calls_before,
+            'throttled': api.throttled}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100, help='users clicking at the same time')
+    parser.add_argument('--groups', type=int, default=20, help='groups to add the bot to before the run')
+    parser.add_argument('--flow', dest='flows', action='append', choices=FLOWS, help='flows to run (repeatable; default all)')
+    parser.add_argument('--admin-id', type=int, help='an ADMIN_IDS user to run one broadcast as')
+    parser.add_argument('--latency', type=float, default=0.0, help='added latency per Bot API call, ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency up to this many ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of sends answered with 429')
+    parser.add_argument('--flood-limit', type=int, default=0, help='sends per second before answering 429 (0 = off)')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds to wait after setup and after the run')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(report + '\n')
+    else: print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# benchmarks/run.py
+"""
+Times database.py functions and handlers against a synthetic database.
+
+Every benchmark calls its target `--iterations` times, keeping up to
+`--concurrency` calls in flight, and reports latency percentiles in
+milliseconds plus throughput in calls per second. Each benchmark runs a short
+warm-up first so steady-state numbers are not skewed by cold caches.
+
+Several benchmarks write (claims, weekly reset, promo runs), so the synthetic
+file is kept pristine and every run works on a fresh copy of it; runs of the
+same sizes, on any commit, start from the same data.
+
+Output is one JSON document:
+
+    {"meta": {"commit": ..., "sizes": {...}, ...},
+     "results": {"db.get_user": {"calls": ..., "p50_ms": ..., "p99_ms": ..., "ops_per_sec": ...}, ...}}
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+import database as db
+from benchmarks import stubs, synthetic
+from benchmarks.stats import git_commit, summarize
+
+WARMUP = 20
+SCRATCH_SUFFIX = '.run'  # the copy a run mutates sits next to the pristine file
+
+
+def scratch_copy(path):
+    """Copies the pristine database at `path` over its scratch file and returns the scratch path."""
+    scratch = path + SCRATCH_SUFFIX
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(scratch + suffix): os.remove(scratch + suffix)
+    shutil.copyfile(path, scratch)
+    return scratch
+
+
+async def measure(call, iterations, concurrency):
+    """Awaits `call(i)` for i in range(iterations) and returns latency/throughput stats."""
+    for i in range(min(WARMUP, iterations)): await call(i)
+    latencies = []
+    pending = iter(range(iterations))
+
+    async def worker():
+        for i in pending:
+            started = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def benchmarks(sizes, rng):
+    """Returns {name: (call, iterations_scale)}; heavy calls run a fraction of the iterations."""
+    import handlers  # Needs config.py, so only imported once the database is set up.
+
+    users, promotions = sizes['users'], sizes['promotions']
+    bot = stubs.StubBot()
+    user = lambda: rng.randint(1, users)
+
+    async def complete_task(_):
+        user_id = user()
+        promo = await db.get_random_promotion(user_id)
+        if promo: await db.complete_task(user_id, promo[0], promo[1], promo[2])
+
+    async def claim_handler(_):
+        user_id = user()
+        promo = await db.get_random_promotion(user_id)
+        if promo and promo[2] == 'normal':
+            await handlers.button_handler(stubs.callback_update(bot, user_id, f'claim_{promo[0]}_{promo[1]}'), stubs.context(bot))
+
+    return {
+        'db.get_user': (lambda _: db.get_user(user()), 1),
+        'db.get_random_promotion': (lambda _: db.get_random_promotion(user()), 1),
+        'db.has_claimed_promo': (lambda _: db.has_claimed_promo(user(), rng.randint(1, promotions)), 1),
+        'db.complete_task': (complete_task, 1),
+        'db.get_leaderboard': (lambda _: db.get_leaderboard(), 1),
+        'db.get_random_users_for_broadcast': (lambda _: db.get_random_users_for_broadcast(user(), 100), 1),
+        'db.get_random_groups': (lambda _: db.get_random_groups(10), 1),
+        'db.use_promo_run': (lambda _: db.use_promo_run(user()), 1),
+        'db.expire_premiums': (lambda _: db.expire_premiums(), 0.01),
+        'db.get_all_user_ids': (lambda _: db.get_all_user_ids(), 0.01),
+        'db.execute_weekly_reset': (lambda _: db.execute_weekly_reset(), 0.01),
+        'handlers.start': (lambda _: handlers.start(stubs.message_update(bot, user(), '/start'), stubs.context(bot)), 1),
+        'handlers.start_callback': (lambda _: handlers.button_handler(stubs.callback_update(bot, user(), 'back_to_main'), stubs.context(bot)), 1),
+        'handlers.tasks': (lambda _: handlers.button_handler(stubs.callback_update(bot, user(), 'earn_credits'), stubs.context(bot)), 1),
+        'handlers.handle_claim_promo': (claim_handler, 1),
+    }
+
+
+async def run(args):
+    sizes = {'users': args.users, 'promotions': args.promotions, 'claims': args.claims, 'groups': args.groups, 'seed': args.seed}
+    meta_path = args.db + '.json'
+    built = None
+    if os.path.exists(meta_path):
+        with open(meta_path) as f: built = json.load(f)
+    if args.rebuild or built != sizes or not os.path.exists(args.db):
+        print(f"Building synthetic database {args.db} ...", file=sys.stderr)
+        started = time.perf_counter()
+        synthetic.build(args.db, **sizes)
+        with open(meta_path, 'w') as f: json.dump(sizes, f)
+        print(f"Built in {time.perf_counter() - started:.1f}s.", file=sys.stderr)
+
+    # Same startup sequence as main.post_init, against a copy of the synthetic file.
+    db.pool.path = scratch_copy(args.db)
+    await db.open_pool()
+    await db.initialize_database()
+    await db.load_task_index()
+    await db.load_eligible_targets()
+    await db.load_feature_flags()
+    await db.load_leaderboard()
+    await db.load_premium_expiries()
+
+    rng = random.Random(args.seed)
+    results = {}
+    try:
+        for name, (call, scale) in benchmarks(sizes, rng).items():
+            if args.only and not any(pattern in name for pattern in args.only): continue
+            iterations = max(1, int(args.iterations * scale))
+            print(f"{name}: {iterations} calls ...", file=sys.stderr)
+            results[name] = await measure(call, iterations, args.concurrency)
+            await db.flush_counters()
+    finally:
+        await db.close_pool()
+
+    return {'meta': {'commit': git_commit(), 'sizes': sizes, 'iterations': args.iterations, 'concurrency': args.concurrency,
+                     'python': sys.version.split()[0], 'cache': db.cache_stats()},
+            'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--db', default='bench_promotion_bot.db', help='pristine synthetic database (reused between runs; each run works on a copy)')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--promotions', type=int, default=10000)
+    parser.add_argument('--claims', type=int, default=1000000)
+    parser.add_argument('--groups', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rebuild', action='store_true', help='regenerate the database even if it matches the sizes')
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--only', action='append', help='run benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(report + '\n')
+    else: print(report)
+
+
+if __name__ == '__main__':
+    main()
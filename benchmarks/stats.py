@@ -0,0 +1,26 @@
+# benchmarks/stats.py
+"""Latency summaries and run metadata shared by the benchmark scripts."""
+import statistics
+import subprocess
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed):
+    """Stats for `latencies` in seconds collected over `elapsed` seconds of wall time."""
+    if not latencies: return {'calls': 0}
+    latencies = sorted(latencies)
+    return {'calls': len(latencies),
+            'mean_ms': statistics.fmean(latencies) * 1000,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+            'ops_per_sec': len(latencies) / elapsed if elapsed else 0.0}
+
+
+def git_commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError): return None
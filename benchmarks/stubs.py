@@ -0,0 +1,77 @@
+# benchmarks/stubs.py
+"""
+Stand-ins for the Bot, Update and context objects the handlers receive.
+
+StubBot answers every Bot API method instantly and records the call, so a
+handler benchmark measures the bot's own work (database, cache, keyboard
+building) and nothing on the network. The update builders provide just the
+attributes handlers.py reads.
+"""
+from types import SimpleNamespace
+
+from telegram.constants import ChatType
+
+
+class StubBot:
+    """Records Bot API calls as (method, args, kwargs) and returns canned results."""
+
+    def __init__(self, bot_id=1, username='bench_bot'):
+        self.id = bot_id
+        self.username = username
+        self.calls = []
+
+    def _record(self, method, args, kwargs):
+        self.calls.append((method, args, kwargs))
+
+    async def get_chat(self, chat_id, *args, **kwargs):
+        self._record('get_chat', (chat_id,) + args, kwargs)
+        return SimpleNamespace(id=chat_id, title=f'Channel {chat_id}', invite_link=f'https://t.me/+{abs(chat_id)}', username=None)
+
+    async def get_chat_member(self, chat_id, user_id, *args, **kwargs):
+        self._record('get_chat_member', (chat_id, user_id) + args, kwargs)
+        return SimpleNamespace(status='member')
+
+    def __getattr__(self, method):
+        async def call(*args, **kwargs):
+            self._record(method, args, kwargs)
+            return SimpleNamespace(message_id=len(self.calls), chat_id=kwargs.get('chat_id'))
+        return call
+
+
+class _Replier:
+    """Message or callback query whose reply methods go to the bot's call log."""
+
+    def __init__(self, bot, chat_id, **attributes):
+        self._bot = bot
+        self.chat_id = chat_id
+        self.__dict__.update(attributes)
+
+    def __getattr__(self, method):
+        async def call(*args, **kwargs):
+            self._bot._record(method, args, kwargs)
+            return SimpleNamespace(message_id=len(self._bot.calls), chat_id=self.chat_id, edit_text=call)
+        return call
+
+
+def _user(user_id):
+    return SimpleNamespace(id=user_id, username=f'user{user_id}', first_name=f'User {user_id}')
+
+
+def message_update(bot, user_id, text):
+    """A private-chat text message from `user_id`."""
+    chat = SimpleNamespace(id=user_id, type=ChatType.PRIVATE)
+    user = _user(user_id)
+    message = _Replier(bot, user_id, text=text, chat=chat, from_user=user, message_id=1)
+    return SimpleNamespace(effective_user=user, effective_chat=chat, message=message, callback_query=None)
+
+
+def callback_update(bot, user_id, data):
+    """An inline button press by `user_id` carrying `data`."""
+    chat = SimpleNamespace(id=user_id, type=ChatType.PRIVATE)
+    user = _user(user_id)
+    query = _Replier(bot, user_id, data=data, from_user=user, message=_Replier(bot, user_id, chat=chat, message_id=1))
+    return SimpleNamespace(effective_user=user, effective_chat=chat, message=None, callback_query=query)
+
+
+def context(bot, args=None):
+    return SimpleNamespace(bot=bot, args=args or [], user_data={}, chat_data={})
@@ -0,0 +1,84 @@
+# benchmarks/synthetic.py
+"""
+Builds a synthetic promotion_bot.db of a given size.
+
+Rows are generated with the stdlib sqlite3 module in large executemany batches,
+with a fixed seed so that two builds of the same size are identical. The schema
+comes from migrations.MIGRATIONS, so the file matches what the bot creates.
+"""
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from migrations import MIGRATIONS, SCHEMA_VERSION
+
+BATCH = 50000
+PREMIUM_SHARE = 0.05
+BANNED_SHARE = 0.01
+FUNDED_SHARE = 0.7  # promotions that still have budget
+FORCE_JOIN_SHARE = 0.2
+ACTIVE_CLICKERS = 0.1  # users with clicks in the current leaderboard week
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield batch
+            batch = []
+    if batch: yield batch
+
+
+def _insert(conn, sql, rows):
+    for batch in _batches(rows): conn.executemany(sql, batch)
+
+
+def build(path, users, promotions, claims, groups, seed=1):
+    """Creates the database at `path`, replacing any existing file. Returns the sizes used."""
+    if os.path.exists(path): os.remove(path)
+    rng = random.Random(seed)
+    today = date.today()
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')  # as pool.py, so startup has nothing to convert
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('BEGIN')
+    for statements in MIGRATIONS:
+        for statement in statements: conn.execute(statement)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def user_rows():
+        for user_id in range(1, users + 1):
+            premium = rng.random() < PREMIUM_SHARE
+            expiry = (today + timedelta(days=rng.randint(-3, 30))).isoformat() if premium else None
+            yield (user_id, f'user{user_id}', rng.randint(0, 200), rng.randint(0, 10), premium, expiry,
+                   rng.random() < BANNED_SHARE, today.toordinal() - rng.randint(0, 3), rng.randint(0, 500))
+    _insert(conn, 'INSERT INTO users (user_id, username, credits, referral_credits, is_premium, premium_expiry, '
+                  'is_banned, quota_day, clicks_received) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', user_rows())
+
+    def promotion_rows():
+        for promo_id in range(1, promotions + 1):
+            force_join = rng.random() < FORCE_JOIN_SHARE
+            budget = rng.randint(1, 500) if rng.random() < FUNDED_SHARE else 0
+            yield (promo_id, rng.randint(1, users), 'force_join' if force_join else 'normal',
+                   -1000000000000 - promo_id if force_join else None,
+                   None if force_join else f'Promotion {promo_id}', None if force_join else f'https://example.com/{promo_id}', budget)
+    _insert(conn, 'INSERT INTO promotions (promo_id, promoter_user_id, promo_type, channel_id, promo_text, promo_url, budget) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?)', promotion_rows())
+
+    if promotions:
+        claim_rows = ((rng.randint(1, users), rng.randint(1, promotions)) for _ in range(claims))
+        _insert(conn, 'INSERT OR IGNORE INTO claimed_promos (user_id, promo_id) VALUES (?, ?)', claim_rows)
+
+    group_rows = ((-1001000000000 - n, rng.randint(1, users), rng.random() < 0.8) for n in range(groups))
+    _insert(conn, 'INSERT INTO groups (group_id, added_by_user_id, is_admin) VALUES (?, ?, ?)', group_rows)
+
+    clicker_rows = ((1, user_id, rng.randint(1, 300)) for user_id in rng.sample(range(1, users + 1), int(users * ACTIVE_CLICKERS)))
+    _insert(conn, 'INSERT INTO weekly_clicks (week, user_id, clicks) VALUES (?, ?, ?)', clicker_rows)
+
+    conn.execute('COMMIT')
+    conn.execute('ANALYZE')
+    conn.close()
+    return {'users': users, 'promotions': promotions, 'claims': claims, 'groups': groups, 'seed': seed}
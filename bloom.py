@@ -0,0 +1,50 @@
+# bloom.py
+"""
+Bloom filter over integer ids.
+
+Answers "definitely not present" exactly and "maybe present" with a bounded
+false-positive rate, in a fixed bit array far smaller than a set of the ids.
+Positions come from one 64-bit splitmix hash split into two halves and
+combined by double hashing, so lookups need no hashlib calls.
+"""
+import math
+
+_MASK = (1 << 64) - 1
+
+
+def _mix(x):
+    """splitmix64 finalizer: spreads consecutive ids over the whole 64-bit range."""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK
+    return x ^ (x >> 31)
+
+
+class BloomFilter:
+    """Sized for `capacity` ids at `error_rate`; `count` tracks how many were added."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def full(self) -> bool:
+        """True once more ids were added than the filter was sized for."""
+        return self.count > self.capacity
+
+    def _positions(self, item):
+        h = _mix(item)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
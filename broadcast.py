@@ -0,0 +1,138 @@
+# broadcast.py
+"""
+Rate-limited fan-out of messages to many chats.
+
+Telegram allows a bot roughly 30 messages per second across all chats. A single
+TokenBucket shared by every sender enforces that limit globally, a bounded pool
+of worker tasks keeps enough requests in flight to use all of it, and RetryAfter
+responses pause the whole bucket for as long as Telegram asks.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from telegram.error import RetryAfter, TimedOut, TelegramError
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_PER_SECOND = 30
+SENDER_CONCURRENCY = 20
+MAX_TIMEOUT_RETRIES = 2
+PROGRESS_INTERVAL = 5  # seconds between the outbox worker's progress reports
+
+
+class TokenBucket:
+    """Async token bucket; waiters are served in FIFO order."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Stops handing out tokens for `seconds`, e.g. after a RetryAfter."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+# Shared by every broadcast so concurrent runs cannot exceed the limit together.
+rate_limiter = TokenBucket(MESSAGES_PER_SECOND)
+
+
+class BroadcastResult:
+    """Running totals of a broadcast."""
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.failed_ids = []  # every chat id that could not be reached
+        self.blocked = []  # the subset that blocked the bot or no longer exists
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+
+def is_unreachable(error: TelegramError) -> bool:
+    """True for errors meaning the chat will never accept messages again."""
+    text = str(error).lower()
+    return "blocked" in text or "deactivated" in text
+
+
+def is_dead_group(error: TelegramError) -> bool:
+    """True for errors meaning the bot can no longer post in a group."""
+    text = str(error).lower()
+    return any(reason in text for reason in ("kicked", "not enough rights", "chat not found", "not a member"))
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else delay
+
+
+async def send_with_retry(send, chat_id):
+    """
+    Awaits `send(chat_id)` under the global rate limit. RetryAfter pauses every
+    sender and retries; timeouts are retried a couple of times before raising.
+    """
+    timeouts = 0
+    while True:
+        await rate_limiter.acquire()
+        try:
+            return await send(chat_id)
+        except RetryAfter as e:
+            delay = _retry_seconds(e)
+            metrics.broadcast_throttled.inc()
+            logger.warning(f"Flood limit hit, pausing all sends for {delay}s.")
+            rate_limiter.pause(delay)
+        except TimedOut:
+            timeouts += 1
+            if timeouts > MAX_TIMEOUT_RETRIES: raise
+
+
+async def run_broadcast(chat_ids, send, concurrency=SENDER_CONCURRENCY, is_dead=is_unreachable) -> BroadcastResult:
+    """
+    Calls `send(chat_id)` for every chat id with up to `concurrency` requests in
+    flight. Chats whose error satisfies `is_dead` are collected in
+    result.blocked. Returns the final BroadcastResult.
+    """
+    result = BroadcastResult(len(chat_ids))
+    pending = iter(chat_ids)
+
+    async def sender():
+        for chat_id in pending:
+            try:
+                await send_with_retry(send, chat_id)
+                result.sent += 1
+                metrics.broadcast_messages.inc(('sent',))
+            except TelegramError as e:
+                result.failed += 1
+                result.failed_ids.append(chat_id)
+                if is_dead(e): result.blocked.append(chat_id)
+                else: logger.warning(f"Broadcast failed for {chat_id}: {e}")
+                metrics.broadcast_messages.inc(('blocked' if is_dead(e) else 'failed',))
+
+    await asyncio.gather(*(sender() for _ in range(min(concurrency, len(chat_ids)))))
+    return result
+
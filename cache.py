@@ -0,0 +1,93 @@
+# cache.py
+"""
+Small in-process caches used in front of the database and the Bot API.
+
+TTLCache is a bounded LRU whose entries also expire after a fixed time. Lookups
+that miss go through get_or_load, which merges concurrent loads of the same key
+into one call. A key invalidated while its load is in flight is not stored, so a
+write that lands during a read can never be overwritten by the older value.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._loading = {}
+        self._stale = set()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None: del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def loading(self, key) -> bool:
+        """True while a get_or_load for `key` is in flight."""
+        return key in self._loading
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+        if key in self._loading: self._stale.add(key)
+
+    def clear(self):
+        self._data.clear()
+        self._stale.update(self._loading)
+
+    async def get_or_load(self, key, loader, negative_ttl=None):
+        """
+        Returns the cached value or awaits `loader(key)`, sharing one load among
+        concurrent callers. None results are only cached if `negative_ttl` is
+        given, and then only for that many seconds.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING: return value
+        if key in self._loading: return await asyncio.shield(self._loading[key])
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader(key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so unawaited failures are not logged.
+            raise
+        else:
+            future.set_result(value)
+            if key not in self._stale:
+                if value is not None: self.set(key, value)
+                elif negative_ttl is not None: self.set(key, None, ttl=negative_ttl)
+            return value
+        finally:
+            del self._loading[key]
+            self._stale.discard(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,77 @@
+# chats.py
+"""
+Cached Telegram chat metadata and membership checks for force-join tasks.
+
+Rendering a force-join task needs the channel's title and an invite link. Both
+are fetched once per channel and kept for CHANNEL_TTL, so the task screen
+normally makes no Bot API calls. Channels the bot cannot access are cached as
+unavailable for a shorter time.
+
+The link is taken from the channel's public username or its primary link. If
+neither exists, one extra invite link is created once and stored in the
+database, so later refreshes and restarts reuse it. exportChatInviteLink is
+never called because it revokes the channel's current primary link.
+
+Membership checks for "Verify & Claim" share one getChatMember call among
+identical (channel_id, user_id) checks in flight, remember positive answers
+briefly, and allow each user one API check per VERIFY_COOLDOWN seconds.
+"""
+import logging
+
+from telegram.error import TelegramError
+
+import database as db
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_TTL = 6 * 3600  # seconds
+UNAVAILABLE_TTL = 300  # seconds to remember a channel the bot cannot access
+MEMBER_TTL = 120  # seconds to trust a positive membership check
+VERIFY_COOLDOWN = 3  # seconds between getChatMember calls for the same user
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+# channel_id -> (title, invite_link), or None for inaccessible channels
+channel_cache = TTLCache(maxsize=5000, ttl=CHANNEL_TTL)
+# (channel_id, user_id) -> True for users recently seen in the channel
+member_cache = TTLCache(maxsize=50000, ttl=MEMBER_TTL)
+# user_id -> True while the user is in their verification cooldown
+_recent_checks = TTLCache(maxsize=50000, ttl=VERIFY_COOLDOWN)
+
+
+async def get_channel(bot, channel_id):
+    """Returns (title, invite_link) for a channel, or None if the bot cannot access it."""
+    async def load(chat_id):
+        try:
+            chat = await bot.get_chat(chat_id)
+            invite_link = chat.invite_link or (f"https://t.me/{chat.username}" if chat.username else await db.get_channel_invite_link(chat_id))
+            if not invite_link:
+                invite_link = (await bot.create_chat_invite_link(chat_id, name="Promotion tasks")).invite_link
+                await db.save_channel_invite_link(chat_id, invite_link)
+            return chat.title, invite_link
+        except TelegramError as e:
+            logger.error(f"Error fetching channel {chat_id} for task: {e}")
+            return None
+    return await channel_cache.get_or_load(channel_id, load, negative_ttl=UNAVAILABLE_TTL)
+
+
+def forget_channel(channel_id):
+    """Drops cached data for a channel, e.g. after it is set as someone's force-join channel."""
+    channel_cache.invalidate(channel_id)
+
+
+async def is_member(bot, channel_id, user_id):
+    """
+    Returns True if the user is in the channel and False if not. Returns None if
+    the user is in cooldown and no cached or in-flight answer exists.
+    Raises TelegramError if the check itself fails.
+    """
+    key = (channel_id, user_id)
+    if not member_cache.loading(key):
+        if member_cache.get(key): return True
+        if _recent_checks.get(user_id): return None
+        _recent_checks.set(user_id, True)
+    async def load(_):
+        member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+        return True if member.status in MEMBER_STATUSES else None
+    return bool(await member_cache.get_or_load(key, load))
@@ -0,0 +1,105 @@
+# counters.py
+"""
+Write-behind buffer for hot additive counters.
+
+Credits, clicks and budgets change by small deltas on almost every task. Instead
+of a connect/UPDATE/commit per +1, deltas are merged in memory per (statement,
+key) and written with one executemany transaction every FLUSH_INTERVAL seconds,
+as soon as MAX_PENDING keys are waiting, and on shutdown.
+
+Readers add pending() to the stored value. Deltas being flushed stay visible
+until their transaction commits. The epoch is bumped just before the commit, so
+a reader whose query overlapped a commit can tell and retry. `on_commit` is
+called with the committed (statement, key) pairs in the same step that drops
+them from the overlay, which lets caches of the stored values invalidate them.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0  # seconds
+MAX_PENDING = 500  # distinct keys that trigger an early flush
+
+
+class CounterBuffer:
+    """
+    Accumulates `sql` increments per key; `sql` takes (delta, key) parameters,
+    or (delta, *key) when the key is a tuple.
+    """
+
+    def __init__(self, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, on_commit=None):
+        self.interval = interval
+        self.on_commit = on_commit
+        self.max_pending = max_pending
+        self.epoch = 0
+        self._pending = {}
+        self._inflight = {}
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._full = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._stopping = False
+
+    def add(self, sql, key, delta):
+        item = (sql, key)
+        self._pending[item] = self._pending.get(item, 0) + delta
+        if len(self._pending) >= self.max_pending: self._full.set()
+
+    def pending(self, sql, key) -> int:
+        """Delta not yet committed for `key`, including any flush in progress."""
+        item = (sql, key)
+        return self._pending.get(item, 0) + self._inflight.get(item, 0)
+
+    async def wait_idle(self):
+        """Returns once no flush is in the middle of committing."""
+        await self._idle.wait()
+
+    async def flush(self, connect):
+        """Writes every pending delta in one transaction on the connection from `connect()`."""
+        async with self._flush_lock:
+            self._full.clear()
+            if not self._pending: return
+            self._inflight, self._pending = self._pending, {}
+            batches = defaultdict(list)
+            for (sql, key), delta in self._inflight.items():
+                if delta: batches[sql].append((delta, *key) if isinstance(key, tuple) else (delta, key))
+            try:
+                async with connect() as db:
+                    for sql, params in batches.items():
+                        await db.executemany(sql, params)
+                    self.epoch += 1
+                    self._idle.clear()
+                    await db.commit()
+                if self.on_commit: self.on_commit(self._inflight.keys())
+            except Exception:
+                for item, delta in self._inflight.items():
+                    self._pending[item] = self._pending.get(item, 0) + delta
+                raise
+            finally:
+                self._inflight = {}
+                self._idle.set()
+
+    def start(self, connect):
+        """Starts the background flusher."""
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(connect))
+
+    async def stop(self, connect):
+        """Stops the background flusher and writes whatever is still pending."""
+        if self._task:
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush(connect)
+
+    async def _run(self, connect):
+        # Never cancelled mid-flush: stop() lets the loop exit on its own.
+        while not self._stopping:
+            try: await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError: pass
+            try: await self.flush(connect)
+            except Exception: logger.exception("Failed to flush counter buffer, will retry.")
@@ -4,149 +4,287 @@ Handles all database operations for the bot using aiosqlite.
 
 This module provides an asynchronous interface for creating tables,
 adding/updating users, managing promotions, groups, and all other
-persistent data. Each function opens and closes its own connection
-to ensure thread safety in an async environment.
+persistent data. All functions share the long-lived connections of a
+ConnectionPool: writes go through a single writer connection held for the
+whole transaction, reads borrow one of the pooled reader connections.
 """
 
 import aiosqlite
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+
+from bloom import BloomFilter
+from cache import TTLCache
+from counters import CounterBuffer
+from expiry import ExpiryHeap
+from leaderboard import Leaderboard
+from migrations import apply_migrations
+from pool import ConnectionPool
+from querylog import QueryProfiler
+from sampler import IdSampler
+from task_index import TaskIndex
 
 DB_NAME = 'promotion_bot.db'
+READER_POOL_SIZE = 4
 logger = logging.getLogger(__name__)
 
+pool = ConnectionPool(DB_NAME, readers=READER_POOL_SIZE)
+task_index = TaskIndex()
+user_cache = TTLCache(maxsize=10000, ttl=30)
+leaderboard = Leaderboard(size=10)
+premium_expiries = ExpiryHeap()
+# Ids of unbanned users and of groups where the bot is admin, for random targeting.
+eligible_users = IdSampler()
+eligible_groups = IdSampler()
+# promo_id -> BloomFilter of the user_ids that claimed it, built lazily from claimed_promos.
+claim_filters = TTLCache(maxsize=20000, ttl=24 * 3600)
+CLAIM_FILTER_MIN_CAPACITY = 1024
+
+# Additive updates, each taking (delta, key). Hot paths route them through the
+# write-behind buffer; complete_task runs them inside its claim transaction.
+_ADD_CREDITS = 'UPDATE users SET credits = credits + ? WHERE user_id = ?'
+_ADD_CLICKS = 'UPDATE users SET clicks_received = clicks_received + ? WHERE user_id = ?'
+_ADD_WEEKLY_CLICKS = '''
+    INSERT INTO weekly_clicks (clicks, week, user_id) VALUES (?, ?, ?)
+    ON CONFLICT (week, user_id) DO UPDATE SET clicks = clicks + excluded.clicks
+'''
+# Applies every daily reset a user missed since their quota_day, in one statement:
+# referral credits accrue once per elapsed day and the daily quotas refill.
+# A NULL quota_day (a row inserted without one) counts as today and is just stamped.
+# Parameters: (today, user_id).
+_DAILY_ROLLOVER = '''
+    UPDATE users SET credits = credits + referral_credits * (?1 - COALESCE(quota_day, ?1)),
+                     daily_promo_runs = CASE WHEN quota_day IS NULL THEN daily_promo_runs WHEN is_premium THEN 5 ELSE 2 END,
+                     image_broadcasts_left = CASE WHEN quota_day IS NOT NULL AND is_premium THEN 100 ELSE image_broadcasts_left END,
+                     quota_day = ?1
+    WHERE user_id = ?2 AND (quota_day IS NULL OR quota_day < ?1)
+'''
+
+def today() -> int:
+    """Current quota day: the ordinal of today's UTC date."""
+    return datetime.now(timezone.utc).date().toordinal()
+
+async def _roll_over(db, user_id):
+    """Applies pending daily resets for `user_id` inside the caller's transaction."""
+    await db.execute(_DAILY_ROLLOVER, (today(), user_id))
+
+# users columns whose pending deltas get_user adds to the stored value
+_USER_COUNTERS = {'credits': _ADD_CREDITS, 'clicks_received': _ADD_CLICKS}
+
+def _on_counters_committed(items):
+    """Drops cached user rows whose stored counters were just rewritten by a flush."""
+    for sql, key in items:
+        if sql in (_ADD_CREDITS, _ADD_CLICKS): user_cache.invalidate(key)
+
+counters = CounterBuffer(on_commit=_on_counters_committed)
+
 def get_db():
-    """Returns a connection context manager to the database."""
-    return aiosqlite.connect(DB_NAME)
+    """Returns a context manager holding the shared writer connection."""
+    return pool.writer()
+
+def read_db():
+    """Returns a context manager borrowing a pooled reader connection."""
+    return pool.reader()
+
+async def open_pool():
+    """Opens the shared connections and starts the counter flusher. Called once from post_init."""
+    await pool.open()
+    counters.start(get_db)
+
+async def close_pool():
+    """Flushes buffered counters and closes the shared connections. Called once on shutdown."""
+    await counters.stop(get_db)
+    await pool.close()
+
+async def flush_counters():
+    """Writes all buffered counter deltas now."""
+    await counters.flush(get_db)
+
+def enable_query_profiling(threshold_ms):
+    """Times every statement and logs those slower than `threshold_ms`. Must be called before open_pool."""
+    pool.profiler = QueryProfiler(threshold_ms / 1000)
+
+def slow_query_report(limit=10):
+    """The statements with the highest total time, or None if profiling is off."""
+    return pool.profiler.top(limit) if pool.profiler else None
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the user-row cache."""
+    return user_cache.stats()
 
 async def initialize_database():
     """
-    Creates all necessary tables if they don't exist.
+    Brings the schema up to date by applying any pending migrations.
     This should be called once when the bot starts.
     """
     async with get_db() as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                credits INTEGER DEFAULT 5,
-                referral_credits INTEGER DEFAULT 0,
-                inviter_id INTEGER,
-                is_premium BOOLEAN DEFAULT FALSE,
-                premium_expiry DATE,
-                is_banned BOOLEAN DEFAULT FALSE,
-                daily_promo_runs INTEGER DEFAULT 2,
-                image_broadcasts_left INTEGER DEFAULT 100,
-                normal_promo_text TEXT,
-                normal_promo_url TEXT,
-                force_join_channel_id INTEGER,
-                clicks_received INTEGER DEFAULT 0
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS groups (
-                group_id INTEGER PRIMARY KEY,
-                added_by_user_id INTEGER,
-                is_admin BOOLEAN DEFAULT FALSE,
-                UNIQUE(group_id)
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS promotions (
-                promo_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                promoter_user_id INTEGER,
-                promo_type TEXT,
-                channel_id INTEGER,
-                promo_text TEXT,
-                promo_url TEXT,
-                budget INTEGER DEFAULT 0
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS claimed_promos (
-                user_id INTEGER,
-                promo_id INTEGER,
-                PRIMARY KEY (user_id, promo_id)
-            )
-        ''')
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS feature_flags (
-                name TEXT PRIMARY KEY,
-                is_enabled BOOLEAN DEFAULT TRUE
-            )
-        ''')
-        
-        flags = ['group_promotion', 'force_join_promotion', 'premium_image_caption']
-        for flag in flags:
-            await db.execute('INSERT OR IGNORE INTO feature_flags (name) VALUES (?)', (flag,))
+        await _enable_incremental_vacuum(db)
+        version = await apply_migrations(db)
+    logger.info(f"Database schema is at version {version}.")
 
-        await db.commit()
-        logger.info("Database tables created or verified successfully.")
+_AUTO_VACUUM_INCREMENTAL = 2
+
+async def _enable_incremental_vacuum(db):
+    """
+    Makes sure the file uses auto_vacuum=INCREMENTAL so the compaction job can
+    hand free pages back to the filesystem. The pool sets the pragma before a new
+    file is initialized; any other database is rebuilt by a single full VACUUM, once.
+    """
+    cursor = await db.execute('PRAGMA auto_vacuum')
+    if (await cursor.fetchone())[0] == _AUTO_VACUUM_INCREMENTAL: return
+    logger.info("Converting database to incremental auto-vacuum; this full VACUUM runs only once...")
+    await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    await db.execute('VACUUM')
 
 # --- User Management ---
 
 async def add_user(user_id, username, inviter_id=None):
     async with get_db() as db:
-        await db.execute('INSERT OR IGNORE INTO users (user_id, username, inviter_id) VALUES (?, ?, ?)', (user_id, username, inviter_id))
+        cursor = await db.execute('INSERT OR IGNORE INTO users (user_id, username, inviter_id, quota_day) VALUES (?, ?, ?, ?)', (user_id, username, inviter_id, today()))
         await db.commit()
+    user_cache.invalidate(user_id)
+    if cursor.rowcount: eligible_users.add(user_id)
 
-async def get_user(user_id):
-    async with get_db() as db:
-        db.row_factory = aiosqlite.Row
+async def _fetch_user(user_id):
+    async with read_db() as db:
         cursor = await db.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        cursor.row_factory = aiosqlite.Row
         row = await cursor.fetchone()
         return dict(row) if row else None
 
+async def get_user(user_id):
+    """
+    Returns the user's row as a dict, served from the user cache when possible
+    and including counter deltas not yet flushed. Daily resets the user missed
+    are applied first.
+    """
+    while True:
+        await counters.wait_idle()
+        epoch = counters.epoch
+        row = await user_cache.get_or_load(user_id, _fetch_user)
+        if row and (row['quota_day'] is None or row['quota_day'] < today()):
+            async with get_db() as db:
+                await _roll_over(db, user_id)
+                await db.commit()
+            user_cache.invalidate(user_id)
+            continue
+        # A flush committed while we were reading: the row may already include its deltas.
+        if counters.epoch == epoch: break
+    if not row: return None
+    user = dict(row)
+    for column, sql in _USER_COUNTERS.items(): user[column] += counters.pending(sql, user_id)
+    return user
+
 async def get_all_user_ids():
-    async with get_db() as db:
+    async with read_db() as db:
         cursor = await db.execute('SELECT user_id FROM users WHERE is_banned = FALSE')
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
 async def update_user_credits(user_id, amount):
-    async with get_db() as db:
-        await db.execute('UPDATE users SET credits = credits + ? WHERE user_id = ?', (amount, user_id))
-        await db.commit()
+    counters.add(_ADD_CREDITS, user_id, amount)
 
 async def update_referral_credits(user_id, amount):
     async with get_db() as db:
+        # Settle missed days at the old rate first, or the rollover would pay `amount` for each of them.
+        await _roll_over(db, user_id)
         await db.execute('UPDATE users SET referral_credits = referral_credits + ? WHERE user_id = ?', (amount, user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
 
 async def ban_user(user_id, is_banned: bool):
     async with get_db() as db:
-        await db.execute('UPDATE users SET is_banned = ? WHERE user_id = ?', (is_banned, user_id))
+        cursor = await db.execute('UPDATE users SET is_banned = ? WHERE user_id = ?', (is_banned, user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
+    if not cursor.rowcount: return
+    if is_banned: eligible_users.discard(user_id)
+    else: eligible_users.add(user_id)
 
-async def set_premium(user_id, days):
+async def set_premium(user_id, days) -> bool:
+    """Grants premium for `days`. Returns False if there is no such user."""
     expiry_date = datetime.now() + timedelta(days=days)
     async with get_db() as db:
-        await db.execute('''
+        await _roll_over(db, user_id)
+        cursor = await db.execute('''
             UPDATE users SET is_premium = TRUE, premium_expiry = ?, daily_promo_runs = 5, image_broadcasts_left = 100
             WHERE user_id = ?
         ''', (expiry_date.date(), user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
+    if not cursor.rowcount: return False
+    premium_expiries.set(user_id, expiry_date.date())
+    return True
 
 async def remove_premium(user_id):
     async with get_db() as db:
+        await _roll_over(db, user_id)
         await db.execute('''
             UPDATE users SET is_premium = FALSE, premium_expiry = NULL, daily_promo_runs = 2
             WHERE user_id = ?
         ''', (user_id,))
         await db.commit()
+    user_cache.invalidate(user_id)
+    premium_expiries.remove(user_id)
+
+async def load_premium_expiries():
+    """Loads every scheduled premium expiry into memory. Called once from post_init."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT user_id, premium_expiry FROM users WHERE premium_expiry IS NOT NULL AND is_premium = TRUE')
+        premium_expiries.load([(user_id, date.fromisoformat(expiry)) for user_id, expiry in await cursor.fetchall()])
+    logger.info(f"Loaded {len(premium_expiries)} premium expiries.")
+
+def next_premium_expiry():
+    """Date of the earliest scheduled premium expiry, or None."""
+    return premium_expiries.next_expiry()
+
+async def expire_premiums():
+    """
+    Demotes, in one transaction, every user whose premium expiry date has
+    passed, the way remove_premium does. Returns the demoted user ids. If the
+    transaction fails, the users stay scheduled and the next run retries them.
+    """
+    due = premium_expiries.pop_due(datetime.now().date())
+    if not due: return []
+    user_ids = [user_id for user_id, _ in due]
+    day = today()
+    try:
+        async with get_db() as db:
+            await db.executemany(_DAILY_ROLLOVER, [(day, user_id) for user_id in user_ids])
+            await db.executemany('UPDATE users SET is_premium = FALSE, premium_expiry = NULL, daily_promo_runs = 2 WHERE user_id = ?', [(user_id,) for user_id in user_ids])
+            await db.commit()
+    except Exception:
+        premium_expiries.restore(due)
+        raise
+    for user_id in user_ids: user_cache.invalidate(user_id)
+    return user_ids
 
 async def use_promo_run(user_id):
     async with get_db() as db:
+        await _roll_over(db, user_id)
         await db.execute('UPDATE users SET daily_promo_runs = daily_promo_runs - 1 WHERE user_id = ? AND daily_promo_runs > 0', (user_id,))
         await db.commit()
+    user_cache.invalidate(user_id)
 
 async def use_image_broadcast_run(user_id, count):
     async with get_db() as db:
+        await _roll_over(db, user_id)
         await db.execute('UPDATE users SET image_broadcasts_left = image_broadcasts_left - ? WHERE user_id = ?', (count, user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
         
+async def load_eligible_targets():
+    """Loads the ids that broadcasts and group shares sample from. Called once from post_init."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT user_id FROM users WHERE is_banned = FALSE')
+        eligible_users.load(row[0] for row in await cursor.fetchall())
+        cursor = await db.execute('SELECT group_id FROM groups WHERE is_admin = TRUE')
+        eligible_groups.load(row[0] for row in await cursor.fetchall())
+    logger.info(f"Loaded {len(eligible_users)} broadcast targets and {len(eligible_groups)} groups.")
+
 async def get_random_users_for_broadcast(exclude_user_id, limit):
-    async with get_db() as db:
+    if eligible_users.loaded: return eligible_users.sample(limit, exclude=(exclude_user_id,))
+    async with read_db() as db:
         cursor = await db.execute('SELECT user_id FROM users WHERE user_id != ? AND is_banned = FALSE ORDER BY RANDOM() LIMIT ?', (exclude_user_id, limit))
         return [row[0] for row in await cursor.fetchall()]
 
@@ -156,20 +294,54 @@ async def set_normal_promo(user_id, text, url):
     async with get_db() as db:
         await db.execute('UPDATE users SET normal_promo_text = ?, normal_promo_url = ? WHERE user_id = ?', (text, url, user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
 
 async def set_force_join_channel(user_id, channel_id):
+    import chats  # chats reads its invite links through this module, so import it late
     async with get_db() as db:
         await db.execute('UPDATE users SET force_join_channel_id = ? WHERE user_id = ?', (channel_id, user_id))
         await db.commit()
+    user_cache.invalidate(user_id)
+    chats.forget_channel(channel_id)
+
+async def get_channel_invite_link(channel_id):
+    """Returns the invite link the bot created for a channel earlier, or None."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT invite_link FROM channel_invite_links WHERE channel_id = ?', (channel_id,))
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+async def save_channel_invite_link(channel_id, invite_link):
+    async with get_db() as db:
+        await db.execute('INSERT OR REPLACE INTO channel_invite_links (channel_id, invite_link) VALUES (?, ?)', (channel_id, invite_link))
+        await db.commit()
 
 async def add_promotion(user_id, promo_type, budget, channel_id=None, text=None, url=None):
     async with get_db() as db:
-        await db.execute('INSERT INTO promotions (promoter_user_id, promo_type, budget, channel_id, promo_text, promo_url) VALUES (?, ?, ?, ?, ?, ?)',
-                         (user_id, promo_type, budget, channel_id, text, url))
+        cursor = await db.execute('INSERT INTO promotions (promoter_user_id, promo_type, budget, channel_id, promo_text, promo_url) VALUES (?, ?, ?, ?, ?, ?)',
+                                  (user_id, promo_type, budget, channel_id, text, url))
         await db.commit()
+    if budget > 0: task_index.add((cursor.lastrowid, user_id, promo_type, channel_id, text, url))
+
+async def load_task_index():
+    """Loads every funded promotion into the in-memory task index. Called once from post_init."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT promo_id, promoter_user_id, promo_type, channel_id, promo_text, promo_url FROM promotions WHERE budget > 0')
+        task_index.load(await cursor.fetchall())
+    logger.info(f"Task index loaded with {len(task_index)} live promotions.")
 
 async def get_random_promotion(user_id):
-    async with get_db() as db:
+    """Picks a random funded promotion the user neither owns nor has claimed."""
+    if not task_index.loaded: return await _query_random_promotion(user_id)
+    if not task_index.has_claims(user_id):
+        async with read_db() as db:
+            cursor = await db.execute('SELECT promo_id FROM claimed_promos WHERE user_id = ?', (user_id,))
+            task_index.set_claims(user_id, [row[0] for row in await cursor.fetchall()])
+    return task_index.pick(user_id)
+
+async def _query_random_promotion(user_id):
+    """SQL fallback used before the task index has been loaded."""
+    async with read_db() as db:
         query = '''
             SELECT p.promo_id, p.promoter_user_id, p.promo_type, p.channel_id, p.promo_text, p.promo_url
             FROM promotions p
@@ -184,26 +356,103 @@ async def claim_promo(user_id, promo_id):
     async with get_db() as db:
         await db.execute('INSERT OR IGNORE INTO claimed_promos (user_id, promo_id) VALUES (?, ?)', (user_id, promo_id))
         await db.commit()
-
-async def decrement_promo_budget(promo_id):
-    async with get_db() as db:
-        await db.execute('UPDATE promotions SET budget = budget - 1 WHERE promo_id = ? AND budget > 0', (promo_id,))
-        await db.commit()
+    _note_claim(user_id, promo_id)
+
+def _note_claim(user_id, promo_id):
+    """Records a committed claim in the task index and the promotion's claim filter."""
+    task_index.mark_claimed(user_id, promo_id)
+    if claim_filters.loading(promo_id):
+        claim_filters.invalidate(promo_id)  # The load may predate this claim; don't keep its result.
+        return
+    claims = claim_filters.get(promo_id)
+    if claims is None: return
+    claims.add(user_id)
+    if claims.full: claim_filters.invalidate(promo_id)  # Rebuilt at a larger size on the next lookup.
+
+async def _load_claim_filter(promo_id):
+    async with read_db() as db:
+        cursor = await db.execute('SELECT user_id FROM claimed_promos WHERE promo_id = ?', (promo_id,))
+        user_ids = [row[0] for row in await cursor.fetchall()]
+    claims = BloomFilter(max(CLAIM_FILTER_MIN_CAPACITY, 2 * len(user_ids)))
+    for user_id in user_ids: claims.add(user_id)
+    return claims
 
 async def has_claimed_promo(user_id, promo_id):
-    async with get_db() as db:
+    """Answered from the promotion's claim filter unless it reports a possible claim."""
+    if user_id not in await claim_filters.get_or_load(promo_id, _load_claim_filter): return False
+    async with read_db() as db:
         cursor = await db.execute('SELECT 1 FROM claimed_promos WHERE user_id = ? AND promo_id = ?', (user_id, promo_id))
         return await cursor.fetchone() is not None
 
-async def increment_clicks_received(user_id):
+# Outcomes reported by complete_task
+TASK_COMPLETED, TASK_ALREADY_CLAIMED, TASK_EXHAUSTED = range(3)
+# Reward per task kind as (regular, premium)
+TASK_REWARDS = {'normal': (1, 2), 'force_join': (2, 4)}
+
+async def complete_task(user_id, promo_id, promoter_id, kind):
+    """
+    Claims a promotion in one transaction: records the claim, spends one unit
+    of budget, pays the user's reward and counts the promoter's view. None of
+    it goes through the counter buffer, so a crash cannot keep the claim but
+    lose the credit.
+    Returns (status, reward); reward is 0 unless status is TASK_COMPLETED.
+    """
+    if not leaderboard.loaded: await load_leaderboard()
     async with get_db() as db:
-        await db.execute('UPDATE users SET clicks_received = clicks_received + 1 WHERE user_id = ?', (user_id,))
+        cursor = await db.execute('INSERT OR IGNORE INTO claimed_promos (user_id, promo_id) VALUES (?, ?)', (user_id, promo_id))
+        if cursor.rowcount == 0:
+            await db.rollback()
+            _note_claim(user_id, promo_id)
+            return TASK_ALREADY_CLAIMED, 0
+        cursor = await db.execute('UPDATE promotions SET budget = budget - 1 WHERE promo_id = ? AND budget > 0', (promo_id,))
+        if cursor.rowcount == 0:
+            await db.rollback()
+            task_index.discard(promo_id)
+            return TASK_EXHAUSTED, 0
+        cursor = await db.execute('SELECT budget FROM promotions WHERE promo_id = ?', (promo_id,))
+        budget_left = (await cursor.fetchone())[0]
+        cursor = await db.execute('SELECT is_premium FROM users WHERE user_id = ?', (user_id,))
+        row = await cursor.fetchone()
+        reward = TASK_REWARDS[kind][1 if row and row[0] else 0]
+        await db.execute(_ADD_CREDITS, (reward, user_id))
+        await db.execute(_ADD_CLICKS, (1, promoter_id))
+        await db.execute(_ADD_WEEKLY_CLICKS, (1, leaderboard.week, promoter_id))
         await db.commit()
+    user_cache.invalidate(user_id)
+    user_cache.invalidate(promoter_id)
+    leaderboard.add(promoter_id)
+    _note_claim(user_id, promo_id)
+    if budget_left <= 0: task_index.discard(promo_id)
+    return TASK_COMPLETED, reward
+
+async def _record_click(user_id):
+    """Counts a view for the promoter: lifetime total, this week's total and the live board."""
+    if not leaderboard.loaded: await load_leaderboard()
+    counters.add(_ADD_CLICKS, user_id, 1)
+    counters.add(_ADD_WEEKLY_CLICKS, (leaderboard.week, user_id), 1)
+    leaderboard.add(user_id)
+
+async def increment_clicks_received(user_id):
+    await _record_click(user_id)
+
+async def load_leaderboard():
+    """Loads the current week's click totals into memory. Called once from post_init."""
+    async with read_db() as db:
+        cursor = await db.execute("SELECT value FROM bot_state WHERE key = 'leaderboard_week'")
+        week = (await cursor.fetchone())[0]
+        cursor = await db.execute('SELECT user_id, clicks FROM weekly_clicks WHERE week = ?', (week,))
+        leaderboard.load(week, await cursor.fetchall())
 
 async def get_leaderboard():
-    async with get_db() as db:
-        cursor = await db.execute('SELECT username, clicks_received FROM users WHERE clicks_received > 0 ORDER BY clicks_received DESC LIMIT 10')
-        return await cursor.fetchall()
+    """Returns [(username, clicks)] for this week's top users, highest first."""
+    if not leaderboard.loaded: await load_leaderboard()
+    top = leaderboard.top()
+    missing = [user_id for user_id, _ in top if user_id not in leaderboard.names]
+    if missing:
+        async with read_db() as db:
+            cursor = await db.execute(f"SELECT user_id, username FROM users WHERE user_id IN ({', '.join('?' for _ in missing)})", missing)
+            leaderboard.names.update(await cursor.fetchall())
+    return [(leaderboard.names.get(user_id), clicks) for user_id, clicks in top]
         
 # --- Group Management ---
 
@@ -212,45 +461,221 @@ async def add_group(group_id, added_by_user_id, is_admin):
         await db.execute('INSERT INTO groups (group_id, added_by_user_id, is_admin) VALUES (?, ?, ?) ON CONFLICT(group_id) DO UPDATE SET is_admin = excluded.is_admin',
                          (group_id, added_by_user_id, is_admin))
         await db.commit()
+    if is_admin: eligible_groups.add(group_id)
+    else: eligible_groups.discard(group_id)
 
-async def get_random_groups(limit):
+async def disable_groups(group_ids):
+    """Marks groups the bot can no longer post in as non-eligible for group shares."""
+    if not group_ids: return
     async with get_db() as db:
+        await db.executemany('UPDATE groups SET is_admin = FALSE WHERE group_id = ?', [(group_id,) for group_id in group_ids])
+        await db.commit()
+    for group_id in group_ids: eligible_groups.discard(group_id)
+
+async def get_random_groups(limit):
+    if eligible_groups.loaded: return eligible_groups.sample(limit)
+    async with read_db() as db:
         cursor = await db.execute('SELECT group_id FROM groups WHERE is_admin = TRUE ORDER BY RANDOM() LIMIT ?', (limit,))
         rows = await cursor.fetchall()
         return [row[0] for row in rows]
 
 # --- Feature Flags ---
+# In-memory registry of every flag, filled by load_feature_flags and kept current by set_feature_flag.
+feature_flags = {}
+
+async def load_feature_flags():
+    """(Re)loads all flags into memory. Called from post_init and the periodic refresh job."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT name, is_enabled FROM feature_flags ORDER BY rowid')
+        rows = await cursor.fetchall()
+    feature_flags.clear()
+    feature_flags.update((name, bool(is_enabled)) for name, is_enabled in rows)
+
+def is_feature_enabled(name) -> bool:
+    """Reads a flag from the in-memory registry without touching the database."""
+    return feature_flags.get(name, False)
+
 async def get_feature_flag(name):
-    async with get_db() as db:
-        cursor = await db.execute('SELECT is_enabled FROM feature_flags WHERE name = ?', (name,))
-        row = await cursor.fetchone()
-        return row[0] if row else False
+    if not feature_flags: await load_feature_flags()
+    return is_feature_enabled(name)
 
 async def set_feature_flag(name, is_enabled: bool):
     async with get_db() as db:
         await db.execute('UPDATE feature_flags SET is_enabled = ? WHERE name = ?', (is_enabled, name))
         await db.commit()
+    if name in feature_flags: feature_flags[name] = bool(is_enabled)
 
 async def get_all_feature_flags():
+    if not feature_flags: await load_feature_flags()
+    return list(feature_flags.items())
+
+# --- Broadcast Outbox ---
+# Delivery state of a row in broadcast_recipients
+RECIPIENT_PENDING, RECIPIENT_SENT, RECIPIENT_FAILED, RECIPIENT_BLOCKED = range(4)
+
+async def create_broadcast_job(kind, owner_id, recipients=None, cost=0, from_chat_id=None, message_id=None,
+                               photo_id=None, caption=None, status_chat_id=None, status_message_id=None):
+    """
+    Queues a broadcast and snapshots its recipients in one transaction.
+    `recipients=None` targets every non-banned user. For 'photo' jobs the owner
+    is charged `cost` credits and one image broadcast per recipient up front;
+    settle_broadcast_job gives back whatever was not delivered.
+    Returns the new job id.
+    """
     async with get_db() as db:
-        cursor = await db.execute('SELECT name, is_enabled FROM feature_flags')
-        return await cursor.fetchall()
+        cursor = await db.execute('''
+            INSERT INTO broadcast_jobs (kind, owner_id, from_chat_id, message_id, photo_id, caption, cost, status_chat_id, status_message_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (kind, owner_id, from_chat_id, message_id, photo_id, caption, cost, status_chat_id, status_message_id))
+        job_id = cursor.lastrowid
+        if recipients is None:
+            cursor = await db.execute('INSERT INTO broadcast_recipients (job_id, user_id) SELECT ?, user_id FROM users WHERE is_banned = FALSE', (job_id,))
+            total = cursor.rowcount
+        else:
+            recipients = set(recipients)
+            await db.executemany('INSERT INTO broadcast_recipients (job_id, user_id) VALUES (?, ?)', [(job_id, user_id) for user_id in recipients])
+            total = len(recipients)
+        await db.execute('UPDATE broadcast_jobs SET total = ? WHERE job_id = ?', (total, job_id))
+        if kind == 'photo':
+            await _roll_over(db, owner_id)
+            await db.execute('UPDATE users SET credits = credits - ?, image_broadcasts_left = image_broadcasts_left - ? WHERE user_id = ?', (cost, total, owner_id))
+        await db.commit()
+    user_cache.invalidate(owner_id)
+    return job_id
 
-# --- Scheduled Job Queries ---
-async def execute_daily_reset():
+async def get_broadcast_job(job_id):
+    async with read_db() as db:
+        cursor = await db.execute('SELECT * FROM broadcast_jobs WHERE job_id = ?', (job_id,))
+        cursor.row_factory = aiosqlite.Row
+        row = await cursor.fetchone()
+        return dict(row) if row else None
+
+async def get_active_broadcast_jobs():
+    """Returns every job the outbox worker still has to act on, oldest first."""
+    async with read_db() as db:
+        cursor = await db.execute("SELECT * FROM broadcast_jobs WHERE status IN ('queued', 'running', 'cancelling') ORDER BY job_id")
+        cursor.row_factory = aiosqlite.Row
+        return [dict(row) for row in await cursor.fetchall()]
+
+async def get_recent_broadcast_jobs(limit=10):
+    async with read_db() as db:
+        cursor = await db.execute('SELECT * FROM broadcast_jobs ORDER BY job_id DESC LIMIT ?', (limit,))
+        cursor.row_factory = aiosqlite.Row
+        return [dict(row) for row in await cursor.fetchall()]
+
+async def get_broadcast_batch(job_id, after_user_id, limit):
+    """Returns up to `limit` recipient ids after the job's cursor, in order."""
+    async with read_db() as db:
+        cursor = await db.execute('SELECT user_id FROM broadcast_recipients WHERE job_id = ? AND user_id > ? ORDER BY user_id LIMIT ?', (job_id, after_user_id, limit))
+        return [row[0] for row in await cursor.fetchall()]
+
+async def checkpoint_broadcast(job_id, cursor_user_id, outcomes, ban_blocked=False):
+    """
+    Stores a batch of (status, user_id) outcomes, bumps the job totals and
+    advances its cursor in a single transaction. With `ban_blocked`, users who
+    blocked the bot are banned in the same transaction.
+    """
+    counts = {RECIPIENT_SENT: 0, RECIPIENT_FAILED: 0, RECIPIENT_BLOCKED: 0}
+    for status, _ in outcomes: counts[status] += 1
     async with get_db() as db:
-        await db.execute('UPDATE users SET credits = credits + referral_credits')
-        await db.execute('UPDATE users SET daily_promo_runs = 2 WHERE is_premium = FALSE')
-        await db.execute('UPDATE users SET daily_promo_runs = 5 WHERE is_premium = TRUE')
+        await db.executemany('UPDATE broadcast_recipients SET status = ? WHERE job_id = ? AND user_id = ?',
+                             [(status, job_id, user_id) for status, user_id in outcomes])
+        await db.execute('UPDATE broadcast_jobs SET cursor = ?, sent = sent + ?, failed = failed + ?, blocked = blocked + ? WHERE job_id = ?',
+                         (cursor_user_id, counts[RECIPIENT_SENT], counts[RECIPIENT_FAILED], counts[RECIPIENT_BLOCKED], job_id))
+        if ban_blocked:
+            await db.executemany('UPDATE users SET is_banned = TRUE WHERE user_id = ?',
+                                 [(user_id,) for status, user_id in outcomes if status == RECIPIENT_BLOCKED])
         await db.commit()
+    if ban_blocked:
+        for status, user_id in outcomes:
+            if status == RECIPIENT_BLOCKED:
+                user_cache.invalidate(user_id)
+                eligible_users.discard(user_id)
+
+async def set_broadcast_job_status(job_id, status, from_statuses):
+    """Moves a job to `status` if it is currently in one of `from_statuses`. Returns True on success."""
+    placeholders = ', '.join('?' for _ in from_statuses)
+    async with get_db() as db:
+        cursor = await db.execute(f'UPDATE broadcast_jobs SET status = ? WHERE job_id = ? AND status IN ({placeholders})', (status, job_id, *from_statuses))
+        await db.commit()
+        return cursor.rowcount > 0
 
-async def execute_weekly_reset():
+async def settle_broadcast_job(job_id, status):
+    """
+    Marks a job 'done' or 'cancelled'. For 'photo' jobs the owner gets back the
+    image broadcasts that were not delivered and, if cancelled, the share of
+    the cost for recipients that were never processed. Returns the final job.
+    """
     async with get_db() as db:
-        await db.execute('UPDATE users SET clicks_received = 0')
+        cursor = await db.execute('SELECT * FROM broadcast_jobs WHERE job_id = ?', (job_id,))
+        cursor.row_factory = aiosqlite.Row
+        job = dict(await cursor.fetchone())
+        await db.execute('UPDATE broadcast_jobs SET status = ? WHERE job_id = ?', (status, job_id))
+        if job['kind'] == 'photo':
+            processed = job['sent'] + job['failed'] + job['blocked']
+            refund = job['cost'] * (job['total'] - processed) // job['total'] if job['total'] else job['cost']
+            await db.execute('UPDATE users SET credits = credits + ?, image_broadcasts_left = image_broadcasts_left + ? WHERE user_id = ?',
+                             (refund, job['total'] - job['sent'], job['owner_id']))
         await db.commit()
+    user_cache.invalidate(job['owner_id'])
+    job['status'] = status
+    return job
+
+# --- Compaction ---
+# Claim rows moved per transaction, so the writer lock is never held for long.
+ARCHIVE_BATCH = 2000
+# Free pages released per incremental_vacuum step.
+VACUUM_PAGES = 2000
 
-async def reset_all_premium_image_broadcasts():
+async def archive_step(batch_size=ARCHIVE_BATCH):
+    """
+    Archives part of one exhausted promotion in a single short transaction: up
+    to `batch_size` of its claims move to archived_claims, and once none are
+    left the promotion itself moves to archived_promotions. Claims are taken in
+    rowid order, which idx_claimed_promos_promo serves directly, so the copy and
+    the delete see the same rows. Returns False when nothing is left to archive.
+    """
     async with get_db() as db:
-        await db.execute('UPDATE users SET image_broadcasts_left = 100 WHERE is_premium = TRUE')
+        cursor = await db.execute('SELECT promo_id FROM promotions WHERE budget = 0 LIMIT 1')
+        row = await cursor.fetchone()
+        if not row: return False
+        promo_id = row[0]
+        await db.execute('''
+            INSERT OR IGNORE INTO archived_claims (user_id, promo_id)
+            SELECT user_id, promo_id FROM claimed_promos WHERE promo_id = ? ORDER BY rowid LIMIT ?
+        ''', (promo_id, batch_size))
+        cursor = await db.execute('DELETE FROM claimed_promos WHERE rowid IN (SELECT rowid FROM claimed_promos WHERE promo_id = ? ORDER BY rowid LIMIT ?)',
+                                  (promo_id, batch_size))
+        if cursor.rowcount < batch_size:
+            await db.execute('''
+                INSERT OR REPLACE INTO archived_promotions (promo_id, promoter_user_id, promo_type, channel_id, promo_text, promo_url)
+                SELECT promo_id, promoter_user_id, promo_type, channel_id, promo_text, promo_url FROM promotions WHERE promo_id = ?
+            ''', (promo_id,))
+            await db.execute('DELETE FROM promotions WHERE promo_id = ?', (promo_id,))
         await db.commit()
+    task_index.discard(promo_id)
+    claim_filters.invalidate(promo_id)
+    return True
+
+async def vacuum_step(pages=VACUUM_PAGES):
+    """Releases up to `pages` free pages to the filesystem. Returns how many free pages remain."""
+    async with get_db() as db:
+        cursor = await db.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+        await cursor.fetchall()  # sqlite3 only runs the whole step once its rows are consumed.
+        cursor = await db.execute('PRAGMA freelist_count')
+        return (await cursor.fetchone())[0]
 
+# --- Scheduled Job Queries ---
+async def execute_weekly_reset():
+    """
+    Starts a new leaderboard week by bumping the week number; users is not
+    touched. Clicks still buffered for the old week are flushed under their
+    own week. Rows older than the previous week are dropped.
+    """
+    if not leaderboard.loaded: await load_leaderboard()
+    week = leaderboard.week + 1
+    leaderboard.rollover(week)
+    async with get_db() as db:
+        await db.execute("UPDATE bot_state SET value = ? WHERE key = 'leaderboard_week'", (week,))
+        await db.execute('DELETE FROM weekly_clicks WHERE week < ?', (week - 1,))
+        await db.commit()
@@ -0,0 +1,58 @@
+# expiry.py
+"""
+In-memory schedule of upcoming premium expirations.
+
+A min-heap ordered by expiry date, loaded once at startup and updated whenever
+premium is granted or removed. Entries made stale by an extension or a removal
+are skipped lazily when they reach the top, so every update is O(log n) and
+finding the next expiry is O(1) amortized.
+"""
+import heapq
+
+
+class ExpiryHeap:
+    """Min-heap of (expiry_date, user_id) with lazy deletion."""
+
+    def __init__(self):
+        self._heap = []
+        self._expiry = {}  # user_id -> current expiry date
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def load(self, rows):
+        """Replaces the schedule with `rows` of (user_id, expiry_date)."""
+        self._expiry = dict(rows)
+        self._heap = [(expiry, user_id) for user_id, expiry in self._expiry.items()]
+        heapq.heapify(self._heap)
+
+    def set(self, user_id, expiry):
+        self._expiry[user_id] = expiry
+        heapq.heappush(self._heap, (expiry, user_id))
+
+    def remove(self, user_id):
+        self._expiry.pop(user_id, None)
+
+    def _drop_stale(self):
+        while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_expiry(self):
+        """Earliest scheduled expiry date, or None."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, today):
+        """Removes and returns (user_id, expiry_date) for the users whose expiry date is before `today`."""
+        due = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] >= today: return due
+            expiry, user_id = heapq.heappop(self._heap)
+            del self._expiry[user_id]
+            due.append((user_id, expiry))
+
+    def restore(self, entries):
+        """Puts back entries returned by pop_due, unless the user was rescheduled meanwhile."""
+        for user_id, expiry in entries:
+            if user_id not in self._expiry: self.set(user_id, expiry)
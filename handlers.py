@@ -7,15 +7,19 @@ including user registration, handling promotions, referrals, tasks, and
 admin functionalities.
 """
 import logging
-import asyncio
 import math
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from telegram.constants import ParseMode, ChatType
 from telegram.error import TelegramError
 
+import broadcast
+import chats
 import config
 import database as db
+import jobs
+import outbox
+import keyboards
 from keyboards import main_menu_keyboard, promotion_management_keyboard, feature_flags_keyboard
 
 logger = logging.getLogger(__name__)
@@ -79,7 +83,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await query.answer()
     data = query.data
     actions = {
-        'promote_link': lambda u, c: u.callback_query.edit_message_text("**🚀 Promotion Menu**\n\nSet up your content or create a new promotion.", reply_markup=promotion_management_keyboard(), parse_mode=ParseMode.MARKDOWN),
+        'promote_link': lambda u, c: u.callback_query.edit_message_text(keyboards.PROMOTION_MENU_TEXT, reply_markup=promotion_management_keyboard(), parse_mode=ParseMode.MARKDOWN),
         'group_share': group_share,
         'earn_credits': tasks,
         'referral_link': referral,
@@ -89,6 +93,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         'my_account': my_account,
         'back_to_main': start,
         'admin_feature_flags': admin_feature_flags,
+        'admin_broadcast_jobs': admin_broadcast_jobs,
         'admin_back': start,
     }
     if data in actions: await actions[data](update, context)
@@ -98,6 +103,9 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         current_status = await db.get_feature_flag(feature_name)
         await db.set_feature_flag(feature_name, not current_status)
         await admin_feature_flags(update, context, is_edit=True)
+    elif data.startswith('bcast_'):
+        if user_id not in config.ADMIN_IDS: return
+        await handle_broadcast_job_action(update, context, data)
     elif data.startswith('claim_'): await handle_claim_promo(update, context, data)
     elif data.startswith('verify_'): await handle_verify_promo(update, context, data)
     elif data.startswith('report_'): await handle_report_start(update, context, data)
@@ -106,14 +114,9 @@ async def handle_claim_promo(update: Update, context: ContextTypes.DEFAULT_TYPE,
     query, user_id = update.callback_query, update.effective_user.id
     _, promo_id_str, promoter_id_str = data.split('_')
     promo_id, promoter_id = int(promo_id_str), int(promoter_id_str)
-    if await db.has_claimed_promo(user_id, promo_id):
-        await query.answer("You have already completed this task.", show_alert=True); return
-    await db.claim_promo(user_id, promo_id)
-    await db.decrement_promo_budget(promo_id)
-    db_user = await db.get_user(user_id)
-    reward = 2 if db_user and db_user['is_premium'] else 1
-    await db.update_user_credits(user_id, reward)
-    await db.increment_clicks_received(promoter_id)
+    status, reward = await db.complete_task(user_id, promo_id, promoter_id, 'normal')
+    if status == db.TASK_ALREADY_CLAIMED: await query.answer("You have already completed this task.", show_alert=True); return
+    if status == db.TASK_EXHAUSTED: await query.edit_message_text("❌ This promotion has run out of budget."); return
     await query.edit_message_text(f"✅ Success! You've earned {reward} credit(s).")
     try: await context.bot.send_message(promoter_id, f"🎉 Someone completed your normal promotion! You received +1 view.")
     except TelegramError as e: logger.warning(f"Could not notify promoter {promoter_id}: {e}")
@@ -125,14 +128,12 @@ async def handle_verify_promo(update: Update, context: ContextTypes.DEFAULT_TYPE
     if await db.has_claimed_promo(user_id, promo_id):
         await query.answer("You have already completed this task.", show_alert=True); return
     try:
-        member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-        if member.status in ['member', 'administrator', 'creator']:
-            await db.claim_promo(user_id, promo_id)
-            await db.decrement_promo_budget(promo_id)
-            db_user = await db.get_user(user_id)
-            reward = 4 if db_user and db_user['is_premium'] else 2
-            await db.update_user_credits(user_id, reward)
-            await db.increment_clicks_received(promoter_id)
+        joined = await chats.is_member(context.bot, channel_id, user_id)
+        if joined is None: await query.answer("Please wait a few seconds before verifying again.", show_alert=True); return
+        if joined:
+            status, reward = await db.complete_task(user_id, promo_id, promoter_id, 'force_join')
+            if status == db.TASK_ALREADY_CLAIMED: await query.answer("You have already completed this task.", show_alert=True); return
+            if status == db.TASK_EXHAUSTED: await query.edit_message_text("❌ This promotion has run out of budget."); return
             await query.edit_message_text(f"✅ Verified! You've earned {reward} credits.")
             try: await context.bot.send_message(promoter_id, "🎉 Someone joined your channel from a promotion! You received +1 view.")
             except TelegramError as e: logger.warning(f"Could not notify promoter {promoter_id}: {e}")
@@ -147,22 +148,28 @@ async def handle_report_start(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 # --- Main Feature Handlers ---
 async def referral(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id, bot = update.effective_user.id, await context.bot.get_me()
-    referral_link = f"https://t.me/{bot.username}?start={user_id}"
+    user_id = update.effective_user.id
+    referral_link = f"https://t.me/{context.bot.username}?start={user_id}"
     text = f"👥 **Your Referral Link**\n\nShare this for **+2 permanent daily credits** per new user!\n\n`{referral_link}`"
-    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back to Menu", callback_data="back_to_main")]])
+    keyboard = keyboards.BACK_TO_MENU
     if update.callback_query: await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
     else: await update.message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
 
+# Rendered leaderboard text, reused until db.leaderboard.version changes
+_leaderboard_text = {'version': None, 'text': None}
+
 async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    board = await db.get_leaderboard()
-    text = "🏆 **Weekly Leaderboard (Top 10)**\n_Based on total views received._\n\n"
-    if not board: text += "The leaderboard is empty."
-    else:
-        for i, (username, clicks) in enumerate(board):
-            rank_icon = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
-            text += f"{rank_icon} @{username or 'Anonymous'} - `{clicks}` views\n"
-    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back to Menu", callback_data="back_to_main")]])
+    if _leaderboard_text['version'] != db.leaderboard.version or not db.leaderboard.loaded:
+        version, board = db.leaderboard.version, await db.get_leaderboard()
+        text = "🏆 **Weekly Leaderboard (Top 10)**\n_Based on total views received._\n\n"
+        if not board: text += "The leaderboard is empty."
+        else:
+            for i, (username, clicks) in enumerate(board):
+                rank_icon = ["🥇", "🥈", "🥉"][i] if i < 3 else f"{i+1}."
+                text += f"{rank_icon} @{username or 'Anonymous'} - `{clicks}` views\n"
+        _leaderboard_text.update(version=version, text=text)
+    text = _leaderboard_text['text']
+    keyboard = keyboards.BACK_TO_MENU
     if update.callback_query: await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
     else: await update.message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
 
@@ -170,7 +177,7 @@ async def tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user_id = update.effective_user.id
     promo = await db.get_random_promotion(user_id)
     if not promo:
-        text, keyboard = "No new tasks available. Check back later!", InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]])
+        text, keyboard = keyboards.NO_TASKS_TEXT, keyboards.BACK
         if update.callback_query: await update.callback_query.edit_message_text(text, reply_markup=keyboard); return
         else: await update.message.reply_text(text, reply_markup=keyboard); return
     promo_id, promoter_id, promo_type, channel_id, promo_text, promo_url = promo
@@ -180,28 +187,24 @@ async def tasks(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         keyboard_buttons.insert(0, [InlineKeyboardButton("✅ Claim Credits", callback_data=f"claim_{promo_id}_{promoter_id}")])
         keyboard_buttons.insert(0, [InlineKeyboardButton("🔗 Visit Link", url=promo_url)])
     else: # force_join
-        try:
-            chat = await context.bot.get_chat(channel_id)
-            invite_link = chat.invite_link or await context.bot.export_chat_invite_link(chat_id=channel_id)
-            text = f"**Task: Join Channel**\n\nJoin **{chat.title}** to earn credits."
+        channel = await chats.get_channel(context.bot, channel_id)
+        if channel:
+            title, invite_link = channel
+            text = f"**Task: Join Channel**\n\nJoin **{title}** to earn credits."
             keyboard_buttons.insert(0, [InlineKeyboardButton("✅ Verify & Claim", callback_data=f"verify_{promo_id}_{channel_id}_{promoter_id}")])
-            keyboard_buttons.insert(0, [InlineKeyboardButton(f"➡️ Join {chat.title}", url=invite_link)])
-        except TelegramError as e: logger.error(f"Error fetching channel for task: {e}"); text, keyboard = "Error with this task.", InlineKeyboardMarkup([[InlineKeyboardButton("➡️ Next", callback_data="earn_credits")]])
+            keyboard_buttons.insert(0, [InlineKeyboardButton(f"➡️ Join {title}", url=invite_link)])
+        else: text = "Error with this task."
     keyboard = InlineKeyboardMarkup(keyboard_buttons)
     if update.callback_query: await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
     else: await update.message.reply_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
 
 async def premium_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    text = "💎 **Premium Membership**\n\n- ✨ Double rewards & higher daily credits\n- ✨ More group promotions\n- ✨ Broadcast images with captions!\n\nContact admin for payment."
-    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("📞 Contact Admin", url=f"https://t.me/{config.OWNER_USERNAME}")], [InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]])
-    await update.callback_query.edit_message_text(text, reply_markup=keyboard)
+    await update.callback_query.edit_message_text(keyboards.PREMIUM_INFO_TEXT, reply_markup=keyboards.PREMIUM_INFO)
 
 async def add_to_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    bot = await context.bot.get_me()
-    add_link = f"https://t.me/{bot.username}?startgroup={update.effective_user.id}"
-    text = "➕ **Add Me to Your Group**\n\nAdd me to your group & make me admin for a credit bonus!\n\n`+5` (Normal) / `+10` (Premium)"
+    add_link = f"https://t.me/{context.bot.username}?startgroup={update.effective_user.id}"
     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("➕ Add to Group", url=add_link)], [InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]])
-    await update.callback_query.edit_message_text(text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+    await update.callback_query.edit_message_text(keyboards.ADD_TO_GROUP_TEXT, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
 
 async def my_account(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     query, user_id = update.callback_query, update.effective_user.id
@@ -215,7 +218,7 @@ async def my_account(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             f"**Credits:** `{user_data['credits']}`\n**Daily Referral Bonus:** `{user_data['referral_credits']}`\n**Premium:** {premium_status}\n\n"
             f"**Usage:**\n - Group Promos Left: `{user_data['daily_promo_runs']}`\n - Image Broadcasts Left: `{user_data['image_broadcasts_left']}`\n\n"
             f"**Saved Promotions:**\n - **Normal Link:**\n{normal_promo}\n - **Force-Join Channel:** {force_join}")
-    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]]), parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
+    await query.edit_message_text(text, reply_markup=keyboards.BACK, parse_mode=ParseMode.MARKDOWN, disable_web_page_preview=True)
 
 # --- Conversation Handlers ---
 async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -289,19 +292,18 @@ async def get_broadcast_count(update: Update, context: ContextTypes.DEFAULT_TYPE
     if count <= 0: await message.reply_text("Must be positive."); return AWAIT_BROADCAST_COUNT
     if count > user['image_broadcasts_left']: await message.reply_text(f"You can only broadcast to `{user['image_broadcasts_left']}` more users today.", parse_mode=ParseMode.MARKDOWN); return AWAIT_BROADCAST_COUNT
     if cost > user['credits']: await message.reply_text(f"Insufficient funds. This costs `{cost}` credits but you have `{user['credits']}`.", parse_mode=ParseMode.MARKDOWN); return AWAIT_BROADCAST_COUNT
-    await message.reply_text("Starting broadcast...")
-    target_users, s, f = await db.get_random_users_for_broadcast(user_id, count), 0, 0
-    photo, caption = context.user_data['broadcast_photo_id'], context.user_data.get('broadcast_caption', '')
-    for target_id in target_users:
-        try: await context.bot.send_photo(target_id, photo, caption=caption); s+=1; await asyncio.sleep(0.2)
-        except TelegramError as e: f+=1; logger.warning(f"Premium broadcast fail for {target_id}: {e}")
-    await db.use_image_broadcast_run(user_id, s)
-    await db.update_user_credits(user_id, -cost)
-    await message.reply_text(f"✅ Broadcast complete!\n- Sent to: `{s}`\n- Failed: `{f}`\n- Cost: `{cost}` credits", parse_mode=ParseMode.MARKDOWN)
+    status = await message.reply_text("Queuing broadcast...")
+    target_users = await db.get_random_users_for_broadcast(user_id, count)
+    job_id = await db.create_broadcast_job('photo', user_id, recipients=target_users, cost=cost,
+                                           photo_id=context.user_data['broadcast_photo_id'], caption=context.user_data.get('broadcast_caption', ''),
+                                           status_chat_id=status.chat_id, status_message_id=status.message_id)
+    outbox.worker.wake()
+    note = outbox.sharing_note(await db.get_active_broadcast_jobs())
+    await status.edit_text(f"✅ Broadcast #{job_id} queued for `{len(target_users)}` users. Cost: `{cost}` credits.\nYou'll get a report when it completes.{note}", parse_mode=ParseMode.MARKDOWN)
     context.user_data.clear(); await start(update, context); return ConversationHandler.END
 
 async def new_group_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    bot, group = await context.bot.get_me(), update.message.chat
+    bot, group = context.bot, update.message.chat
     if bot.id not in [m.id for m in update.message.new_chat_members]: return
     logger.info(f"Bot added to group '{group.title}' ({group.id})")
     adder_user_id = int(context.args[0]) if context.args and context.args[0].isdigit() else update.message.from_user.id
@@ -325,29 +327,65 @@ async def group_share(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     limit = 10 if user['is_premium'] else 5
     groups = await db.get_random_groups(limit)
     if not groups: await query.answer("No available groups now.", show_alert=True); return
+    # Spend the run before sending so a second tap cannot start another share.
+    await db.use_promo_run(user['user_id'])
     await query.edit_message_text(f"🚀 Sending to {len(groups)} groups...")
-    s, f = 0, 0
+    context.application.create_task(_share_to_groups(context.bot, query.message, user, groups), update=update)
+
+async def _share_to_groups(bot, status, user, groups):
+    """Posts a user's normal promotion to `groups` in the background and reports the result."""
     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🔗 Visit Link", url=user['normal_promo_url'])]])
-    for group_id in groups:
-        try: await context.bot.send_message(group_id, user['normal_promo_text'], reply_markup=keyboard, disable_web_page_preview=True); s+=1; await asyncio.sleep(0.5)
-        except TelegramError as e: f+=1; logger.warning(f"Failed to send to group {group_id}: {e}")
-    await db.use_promo_run(user['user_id'])
+    send = lambda group_id: bot.send_message(group_id, user['normal_promo_text'], reply_markup=keyboard, disable_web_page_preview=True)
+    result = await broadcast.run_broadcast(groups, send, is_dead=broadcast.is_dead_group)
+    if result.blocked:
+        logger.info(f"Disabling {len(result.blocked)} groups the bot can no longer post in.")
+        await db.disable_groups(result.blocked)
     updated_user = await db.get_user(user['user_id'])
-    await query.edit_message_text(f"✅ Sent to `{s}` groups, failed for `{f}`.\nRuns left: `{updated_user['daily_promo_runs']}`", parse_mode=ParseMode.MARKDOWN)
-    await asyncio.sleep(5); await start(update, context)
+    try: await status.edit_text(f"✅ Sent to `{result.sent}` groups, failed for `{result.failed}`.\nRuns left: `{updated_user['daily_promo_runs']}`", reply_markup=keyboards.BACK_TO_MENU, parse_mode=ParseMode.MARKDOWN)
+    except TelegramError as e: logger.warning(f"Could not report group share to {user['user_id']}: {e}")
 
 async def admin_broadcast_start(update: Update, context: ContextTypes.DEFAULT_TYPE): await update.callback_query.message.reply_text("Send message to broadcast.\n\n/cancel"); return BROADCAST_MESSAGE
 async def get_broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    message, user_ids = update.message, await db.get_all_user_ids()
-    await message.reply_text(f"Broadcasting to {len(user_ids)} users...")
-    s, f, b = 0, 0, 0
-    for user_id in user_ids:
-        try: await context.bot.copy_message(user_id, message.chat_id, message.message_id); s+=1; await asyncio.sleep(0.1)
-        except TelegramError as e:
-            f+=1; logger.warning(f"Broadcast failed for {user_id}: {e}")
-            if "blocked" in str(e).lower() or "deactivated" in str(e).lower(): b+=1; await db.ban_user(user_id, True)
-    report = f"**🚀 Broadcast Complete**\n\n✅ Sent: `{s}`\n❌ Failed: `{f}`\n🚫 Banned: `{b}`"
-    await message.reply_text(report, parse_mode=ParseMode.MARKDOWN); await start(update, context); return ConversationHandler.END
+    message = update.message
+    status = await message.reply_text("Queuing broadcast...")
+    job_id = await db.create_broadcast_job('copy', update.effective_user.id, from_chat_id=message.chat_id, message_id=message.message_id,
+                                           status_chat_id=status.chat_id, status_message_id=status.message_id)
+    outbox.worker.wake()
+    note = outbox.sharing_note(await db.get_active_broadcast_jobs())
+    await status.edit_text(f"📬 Broadcast #{job_id} queued. Manage it from 📬 Broadcast Jobs.{note}")
+    await start(update, context); return ConversationHandler.END
+
+async def admin_broadcast_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    recent, active = await db.get_recent_broadcast_jobs(), await db.get_active_broadcast_jobs()
+    header = f"📬 **Broadcast Jobs**\n{len(active)} active, sending {outbox.BATCH_SIZE} messages per turn.\n\n" if active else "📬 **Broadcast Jobs**\n\n"
+    text = header + ("\n\n".join(outbox.format_job(job) for job in recent) if recent else "No broadcasts yet.")
+    buttons = []
+    for job in recent:
+        if job['status'] in ('queued', 'running'): buttons.append([InlineKeyboardButton(f"⏸ Pause #{job['job_id']}", callback_data=f"bcast_pause_{job['job_id']}"), InlineKeyboardButton(f"✖️ Cancel #{job['job_id']}", callback_data=f"bcast_cancel_{job['job_id']}")])
+        elif job['status'] == 'paused': buttons.append([InlineKeyboardButton(f"▶️ Resume #{job['job_id']}", callback_data=f"bcast_resume_{job['job_id']}"), InlineKeyboardButton(f"✖️ Cancel #{job['job_id']}", callback_data=f"bcast_cancel_{job['job_id']}")])
+    buttons.append([InlineKeyboardButton("🔄 Refresh", callback_data="admin_broadcast_jobs"), InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="admin_back")])
+    await update.callback_query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(buttons), parse_mode=ParseMode.MARKDOWN)
+
+async def handle_broadcast_job_action(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
+    _, action, job_id_str = data.split('_')
+    status, from_statuses = outbox.ACTIONS[action]
+    if not await db.set_broadcast_job_status(int(job_id_str), status, from_statuses):
+        await update.callback_query.answer("This job can no longer be changed.", show_alert=True)
+    outbox.worker.wake()
+    await admin_broadcast_jobs(update, context)
+
+async def admin_slow_queries(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/slowqueries: the statements with the most total time since startup (admins only)."""
+    if update.effective_user.id not in config.ADMIN_IDS: return
+    report = db.slow_query_report(10)
+    if report is None: await update.message.reply_text("Query profiling is off. Set SLOW_QUERY_MS in config to enable it."); return
+    if not report: await update.message.reply_text("No queries recorded yet."); return
+    lines = ["🐢 **Top queries by total time**"]
+    for entry in report:
+        flag = " ⚠️ full scan" if entry.full_scans else ""
+        lines.append(f"\n`{entry.sql[:120]}`\n{entry.calls} calls | total `{entry.total * 1000:.0f}` ms | avg `{entry.total / entry.calls * 1000:.2f}` ms | "
+                     f"max `{entry.max * 1000:.1f}` ms | slow `{entry.slow}`{flag}")
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.MARKDOWN)
 
 async def admin_add_premium_start(update: Update, context: ContextTypes.DEFAULT_TYPE): await update.callback_query.message.reply_text("Send User ID to grant Premium.\n\n/cancel."); return AWAIT_USER_ID_FOR_PREMIUM
 async def get_user_id_for_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -358,7 +396,10 @@ async def get_premium_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try: days = int(update.message.text)
     except ValueError: await update.message.reply_text("Invalid number."); return AWAIT_PREMIUM_DAYS
     user_id = context.user_data['target_user_id']
-    await db.set_premium(user_id, days)
+    if not await db.set_premium(user_id, days):
+        await update.message.reply_text(f"❌ User `{user_id}` not found.", parse_mode=ParseMode.MARKDOWN)
+        context.user_data.clear(); await start(update, context); return ConversationHandler.END
+    jobs.schedule_premium_expiry(context.job_queue)
     await update.message.reply_text(f"✅ User `{user_id}` is now premium for {days} days.", parse_mode=ParseMode.MARKDOWN)
     context.user_data.clear(); await start(update, context); return ConversationHandler.END
 
@@ -366,7 +407,7 @@ async def admin_remove_premium_start(update: Update, context: ContextTypes.DEFAU
 async def get_user_id_for_remove_premium(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try: user_id = int(update.message.text)
     except ValueError: await update.message.reply_text("Invalid ID."); return AWAIT_USER_ID_FOR_REMOVE_PREMIUM
-    await db.remove_premium(user_id); await update.message.reply_text(f"✅ Premium removed from user `{user_id}`.", parse_mode=ParseMode.MARKDOWN); await start(update, context); return ConversationHandler.END
+    await db.remove_premium(user_id); jobs.schedule_premium_expiry(context.job_queue); await update.message.reply_text(f"✅ Premium removed from user `{user_id}`.", parse_mode=ParseMode.MARKDOWN); await start(update, context); return ConversationHandler.END
 
 async def admin_ban_user_start(update: Update, context: ContextTypes.DEFAULT_TYPE): await update.callback_query.message.reply_text("Send User ID to BAN.\n\n/cancel."); return AWAIT_USER_ID_FOR_BAN
 async def get_user_id_for_ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -389,7 +430,7 @@ async def get_user_id_for_stats(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN); await start(update, context); return ConversationHandler.END
 
 async def admin_feature_flags(update: Update, context: ContextTypes.DEFAULT_TYPE, is_edit: bool = False):
-    flags, keyboard = await db.get_all_feature_flags(), await feature_flags_keyboard(await db.get_all_feature_flags())
+    keyboard = await feature_flags_keyboard(await db.get_all_feature_flags())
     text = "⚙️ **Feature Control Panel**\n\nEnable or disable features for all users."
     if update.callback_query: await update.callback_query.edit_message_text(text, reply_markup=keyboard)
     else: await update.message.reply_text(text, reply_markup=keyboard)
@@ -0,0 +1,169 @@
+# httpserver.py
+"""
+Minimal HTTP/1.1 server on asyncio streams.
+
+Serves the bot's small local endpoints without pulling in a web framework.
+It understands Content-Length bodies and keep-alive connections, which is all
+Telegram's webhook client and local tools like curl need. `handler` is an
+async function taking a Request and returning a Response.
+
+stop() shuts down gracefully: the listening socket is closed, idle keep-alive
+connections are closed, and requests already being handled are allowed to
+finish (up to a timeout) with their responses sent as "Connection: close".
+Only connections still busy after the timeout are cancelled.
+"""
+import asyncio
+import logging
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 60  # seconds a keep-alive connection may sit idle
+REASONS = {
+    200: 'OK', 204: 'No Content', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 411: 'Length Required', 413: 'Payload Too Large',
+    429: 'Too Many Requests', 431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """Raised while parsing a request that must be answered with `status`."""
+
+    def __init__(self, status):
+        super().__init__(REASONS.get(status, str(status)))
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        self.version = version
+        self.headers = headers  # lower-cased names
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0': return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class Response:
+    def __init__(self, status=200, body=b'', content_type='text/plain; charset=utf-8', headers=None):
+        self.status = status
+        self.body = body.encode() if isinstance(body, str) else body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+
+async def _read_request(reader, max_body):
+    """Reads one request, or returns None if the client closed the connection between requests."""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as e:
+        if not e.partial: return None
+        raise
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431)
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ', 2)
+    except ValueError:
+        raise HTTPError(400)
+    headers = {}
+    for line in lines[1:]:
+        if not line: continue
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower(): raise HTTPError(411)
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HTTPError(400)
+    if length > max_body: raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b''
+    return Request(method, target, version, headers, body)
+
+
+async def _write_response(writer, response, keep_alive):
+    head = [f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}",
+            f"Content-Type: {response.content_type}",
+            f"Content-Length: {len(response.body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{name}: {value}" for name, value in response.headers.items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + response.body)
+    await writer.drain()
+
+
+class HTTPServer:
+    """Serves `handler` on host:port until stop() is called."""
+
+    def __init__(self, handler, host='127.0.0.1', port=8080, max_body=MAX_BODY_BYTES, idle_timeout=IDLE_TIMEOUT):
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._closing = False
+        self._connections = set()
+        self._idle = {}  # task -> writer of connections waiting for their next request
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else ()
+
+    async def start(self):
+        self._closing = False
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=MAX_HEADER_BYTES)
+        if not self.port: self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self, timeout=10):
+        """Stops accepting connections and waits up to `timeout` seconds for in-flight requests."""
+        if not self._server: return
+        self._closing = True
+        self._server.close()
+        for writer in list(self._idle.values()): writer.close()  # their pending read sees EOF and returns
+        if self._connections: await asyncio.wait(list(self._connections), timeout=timeout)
+        stuck = list(self._connections)
+        for task in stuck: task.cancel()
+        if stuck: await asyncio.wait(stuck)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        self._idle[task] = writer
+        try:
+            while not self._closing:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader, self.max_body), self.idle_timeout)
+                except HTTPError as e:
+                    await _write_response(writer, Response(e.status, str(e)), keep_alive=False)
+                    break
+                if request is None: break
+                self._idle.pop(task, None)
+                try:
+                    response = await self.handler(request)
+                except Exception:
+                    logger.exception(f"Unhandled error serving {request.method} {request.path}")
+                    response = Response(500, REASONS[500])
+                keep_alive = request.keep_alive and not self._closing
+                await _write_response(writer, response, keep_alive)
+                if not keep_alive: break
+                self._idle[task] = writer
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # stop() gave up waiting on this connection; it is closed below
+        finally:
+            self._idle.pop(task, None)
+            self._connections.discard(task)
+            writer.close()
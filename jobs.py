@@ -3,48 +3,87 @@
 Contains all the scheduled job functions for the bot.
 
 These functions are run periodically by the APScheduler job queue
-to perform tasks like daily credit resets and weekly leaderboard clearing.
+to perform tasks like weekly leaderboard rollover. Daily limits and
+referral credits are not reset here: database.get_user applies them
+lazily the next time each user is seen.
 """
+import asyncio
 import logging
-from datetime import time
-from telegram.ext import ContextTypes
+from datetime import datetime, time, timedelta
+from telegram.ext import ContextTypes, JobQueue
 
+import broadcast
 import database as db
 
 logger = logging.getLogger(__name__)
 
-async def daily_credit_reset(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """
-    Resets daily limits and adds referral credits for all users.
-    This job runs once every 24 hours.
-    """
-    logger.info("Running daily credit reset job...")
-    
-    # Logic to add referral credits to main credits and reset daily runs
-    await db.execute_daily_reset()
-    
-    logger.info("Daily credit reset job completed.")
+COMPACTION_TIME_BUDGET = 60  # seconds one compaction run may spend before leaving the rest for the next
+EXPIRY_RETRY_SECONDS = 60  # delay before retrying a premium expiry run whose transaction failed
 
 async def weekly_leaderboard_reset(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Resets the 'clicks_received' counter for all users.
+    Starts a new leaderboard week.
     This job runs once every week (e.g., on Monday).
     """
     logger.info("Running weekly leaderboard reset job...")
     
-    # Logic to reset the clicks_received column
+    # Rolls the leaderboard over to a new week; no user rows are rewritten
     await db.execute_weekly_reset()
     
     logger.info("Weekly leaderboard reset job completed.")
 
-async def reset_image_broadcasts(context: ContextTypes.DEFAULT_TYPE) -> None:
+async def refresh_feature_flags(context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Resets the 'image_broadcasts_left' counter for all premium users.
-    This job runs once every 24 hours.
+    Reloads feature flags from the database.
+    Only needed to pick up edits made outside the bot; toggles made through
+    the admin panel update the in-memory registry immediately.
     """
-    logger.info("Running daily reset for premium image broadcasts...")
-    
-    await db.reset_all_premium_image_broadcasts()
-    
-    logger.info("Premium image broadcast limits reset.")
+    await db.load_feature_flags()
+
+async def expire_premium(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Demotes every user whose premium has run out and notifies them.
+    Runs once at the next expiry and then re-arms itself for the one after.
+    """
+    try:
+        user_ids = await db.expire_premiums()
+    except Exception:
+        logger.exception(f"Expiring premiums failed; retrying in {EXPIRY_RETRY_SECONDS}s.")
+        context.job_queue.run_once(expire_premium, when=EXPIRY_RETRY_SECONDS, name="premium_expiry")
+        return
+    if user_ids:
+        logger.info(f"Premium expired for {len(user_ids)} users.")
+        text = "⌛ Your premium membership has expired. Contact the admin to renew it."
+        result = await broadcast.run_broadcast(user_ids, lambda user_id: context.bot.send_message(user_id, text))
+        logger.info(f"Premium expiry notices: {result.sent} sent, {result.failed} failed.")
+    schedule_premium_expiry(context.job_queue)
 
+def schedule_premium_expiry(job_queue: JobQueue) -> None:
+    """
+    (Re)arms the premium expiry job for the earliest scheduled expiry.
+    Premium lasts through its expiry date, so the job wakes at the following midnight.
+    """
+    for job in job_queue.get_jobs_by_name("premium_expiry"): job.schedule_removal()
+    expiry = db.next_premium_expiry()
+    if expiry is None: return
+    wake_at = datetime.combine(expiry + timedelta(days=1), time(0, 0))
+    job_queue.run_once(expire_premium, when=max(0, (wake_at - datetime.now()).total_seconds()), name="premium_expiry")
+
+async def compact_database(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Moves exhausted promotions and their claims into the archive tables, then
+    returns the freed pages to the filesystem. Every step is its own short
+    transaction and the job yields between steps, so handlers waiting for the
+    writer are never held up for long.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + COMPACTION_TIME_BUDGET
+    steps = 0
+    while loop.time() < deadline and await db.archive_step():
+        steps += 1
+        await asyncio.sleep(0)
+    free_pages = 1
+    while free_pages and loop.time() < deadline:
+        free_pages = await db.vacuum_step()
+        await asyncio.sleep(0)
+    if steps: logger.info(f"Compaction archived claims/promotions in {steps} steps; {free_pages} free pages left.")
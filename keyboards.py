@@ -3,17 +3,16 @@
 Defines all inline keyboard layouts used by the bot.
 
 This module centralizes the creation of InlineKeyboardMarkup objects,
-making it easy to manage and update the bot's user interface.
+making it easy to manage and update the bot's user interface. Keyboards
+and texts that never change are built once at import time and shared by
+every update; InlineKeyboardMarkup objects are immutable, so reusing them
+is safe.
 """
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 import config
 
-async def main_menu_keyboard(user_id) -> InlineKeyboardMarkup:
-    """
-    Returns the main menu keyboard.
-    If the user is an admin, it integrates admin controls directly into the menu.
-    """
+def _build_main_menu(is_admin: bool) -> InlineKeyboardMarkup:
     keyboard = [
         [InlineKeyboardButton("🚀 Promote My Link", callback_data='promote_link'),
          InlineKeyboardButton("📢 Group Share", callback_data='group_share')],
@@ -26,28 +25,49 @@ async def main_menu_keyboard(user_id) -> InlineKeyboardMarkup:
         [InlineKeyboardButton("➕ Add Me to Group", callback_data='add_to_group')]
     ]
     
-    if user_id in config.ADMIN_IDS:
+    if is_admin:
         admin_rows = [
             [InlineKeyboardButton("——— 👑 Admin Menu 👑 ———", callback_data='admin_menu_title')],
             [InlineKeyboardButton("💬 Broadcast", callback_data='admin_broadcast'), InlineKeyboardButton("📊 User Stats", callback_data='admin_stats')],
             [InlineKeyboardButton("➕ Add Premium", callback_data='admin_add_premium'), InlineKeyboardButton("🗑️ Remove Premium", callback_data='admin_remove_premium')],
             [InlineKeyboardButton("🚫 Ban User", callback_data='admin_ban_user'), InlineKeyboardButton("✅ Unban User", callback_data='admin_unban_user')],
-            [InlineKeyboardButton("⚙️ Feature Flags", callback_data='admin_feature_flags')]
+            [InlineKeyboardButton("⚙️ Feature Flags", callback_data='admin_feature_flags'), InlineKeyboardButton("📬 Broadcast Jobs", callback_data='admin_broadcast_jobs')]
         ]
         keyboard.extend(admin_rows)
 
     return InlineKeyboardMarkup(keyboard)
 
+# --- Prebuilt static keyboards ---
+MAIN_MENU = _build_main_menu(is_admin=False)
+ADMIN_MAIN_MENU = _build_main_menu(is_admin=True)
+PROMOTION_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📢 Create a Promotion", callback_data='create_promotion')],
+    [InlineKeyboardButton("✏️ Set/Update Normal Link", callback_data='set_normal_link')],
+    [InlineKeyboardButton("🔔 Set/Update Force-Join Channel", callback_data='set_force_channel')],
+    [InlineKeyboardButton("⬅️ Back to Main Menu", callback_data='back_to_main')]
+])
+BACK_TO_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back to Menu", callback_data="back_to_main")]])
+BACK = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]])
+PREMIUM_INFO = InlineKeyboardMarkup([[InlineKeyboardButton("📞 Contact Admin", url=f"https://t.me/{config.OWNER_USERNAME}")], [InlineKeyboardButton("⬅️ Back", callback_data="back_to_main")]])
+
+# --- Static message texts ---
+PROMOTION_MENU_TEXT = "**🚀 Promotion Menu**\n\nSet up your content or create a new promotion."
+PREMIUM_INFO_TEXT = "💎 **Premium Membership**\n\n- ✨ Double rewards & higher daily credits\n- ✨ More group promotions\n- ✨ Broadcast images with captions!\n\nContact admin for payment."
+ADD_TO_GROUP_TEXT = "➕ **Add Me to Your Group**\n\nAdd me to your group & make me admin for a credit bonus!\n\n`+5` (Normal) / `+10` (Premium)"
+NO_TASKS_TEXT = "No new tasks available. Check back later!"
+
+async def main_menu_keyboard(user_id) -> InlineKeyboardMarkup:
+    """
+    Returns the main menu keyboard.
+    If the user is an admin, it integrates admin controls directly into the menu.
+    """
+    return ADMIN_MAIN_MENU if user_id in config.ADMIN_IDS else MAIN_MENU
+
 def promotion_management_keyboard() -> InlineKeyboardMarkup:
     """Keyboard for the main promotion menu."""
-    keyboard = [
-        [InlineKeyboardButton("📢 Create a Promotion", callback_data='create_promotion')],
-        [InlineKeyboardButton("✏️ Set/Update Normal Link", callback_data='set_normal_link')],
-        [InlineKeyboardButton("🔔 Set/Update Force-Join Channel", callback_data='set_force_channel')],
-        [InlineKeyboardButton("⬅️ Back to Main Menu", callback_data='back_to_main')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-    
+    return PROMOTION_MENU
+
+
 async def feature_flags_keyboard(flags: list) -> InlineKeyboardMarkup:
     """Dynamically creates a keyboard for toggling feature flags."""
     keyboard = []
@@ -0,0 +1,49 @@
+# leaderboard.py
+"""
+Weekly leaderboard kept up to date in memory.
+
+Clicks are counted per leaderboard week in the weekly_clicks table. This module
+mirrors the current week's totals and keeps the top N sorted as clicks arrive,
+so showing the leaderboard never scans users. Starting a new week only bumps
+the week number; nothing is rewritten.
+"""
+
+
+class Leaderboard:
+    """Current week's click totals with the top `size` entries kept sorted."""
+
+    def __init__(self, size=10):
+        self.size = size
+        self.week = None
+        self.version = 0  # bumped whenever the top entries change
+        self.names = {}  # user_id -> username, for users on the board
+        self._clicks = {}
+        self._top = []
+
+    @property
+    def loaded(self) -> bool:
+        return self.week is not None
+
+    def load(self, week, rows):
+        """Replaces the state with `rows` of (user_id, clicks) for `week`."""
+        self.week = week
+        self._clicks = {user_id: clicks for user_id, clicks in rows}
+        self._top = sorted(((-clicks, user_id) for user_id, clicks in self._clicks.items() if clicks > 0))[:self.size]
+        self.version += 1
+
+    def add(self, user_id, delta=1):
+        clicks = self._clicks.get(user_id, 0) + delta
+        self._clicks[user_id] = clicks
+        on_board = any(entry_user == user_id for _, entry_user in self._top)
+        if not on_board and len(self._top) >= self.size and (-clicks, user_id) > self._top[-1]: return
+        self._top = sorted([entry for entry in self._top if entry[1] != user_id] + [(-clicks, user_id)])[:self.size]
+        self.version += 1
+
+    def rollover(self, week):
+        """Starts an empty board for `week`."""
+        self.load(week, [])
+        self.names.clear()
+
+    def top(self):
+        """Returns [(user_id, clicks)] for the top entries, highest first."""
+        return [(user_id, -negative_clicks) for negative_clicks, user_id in self._top]
@@ -4,8 +4,10 @@ The main entry point for the Telegram Promotion Bot.
 
 This script initializes the database, sets up the bot application,
 registers all command and message handlers, schedules periodic jobs,
-and starts the bot's polling loop.
+and starts the bot, either polling or behind a webhook server
+(config.RUN_MODE = 'webhook').
 """
+import asyncio
 import logging
 from telegram.ext import (
     Application,
@@ -16,10 +18,15 @@ from telegram.ext import (
     ConversationHandler,
 )
 
+import chats
 import config
 import database as db
 import handlers
 import jobs
+import metrics
+import outbox
+from update_processor import KeyedUpdateProcessor
+import webhook
 
 # --- Pre-run setup ---
 # Enable logging
@@ -33,11 +40,34 @@ async def post_init(application: Application):
     """
     Post-initialization function.
     This is called by the Application builder after everything is set up.
-    We use it to initialize our database.
+    We use it to open the database connections and initialize our tables.
     """
+    # Application.initialize() has already called getMe; bot.id and bot.username are cached from here on.
+    logger.info(f"Running as @{application.bot.username} ({application.bot.id}).")
     logger.info("Initializing database...")
+    await db.open_pool()
     await db.initialize_database()
+    await db.load_task_index()
+    await db.load_eligible_targets()
+    await db.load_feature_flags()
+    await db.load_leaderboard()
+    await db.load_premium_expiries()
+    jobs.schedule_premium_expiry(application.job_queue)
     logger.info("Database initialized.")
+    outbox.worker.start(application.bot)
+    metrics_port = getattr(config, 'METRICS_PORT', 9464)
+    if metrics_port: await metrics.start_server(getattr(config, 'METRICS_HOST', '127.0.0.1'), metrics_port)
+
+
+async def post_shutdown(application: Application):
+    """
+    Post-shutdown function.
+    Called once the application has stopped; checkpoints the broadcast outbox
+    and closes the database connections.
+    """
+    await metrics.stop_server()
+    await outbox.worker.stop()
+    await db.close_pool()
 
 
 def main() -> None:
@@ -47,7 +77,20 @@ def main() -> None:
     sets up jobs, and starts the bot.
     """
     # Create the Application and pass it your bot's token.
-    builder = Application.builder().token(config.BOT_TOKEN).post_init(post_init)
+    builder = Application.builder().token(config.BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    base_url = getattr(config, 'BOT_API_BASE_URL', None)
+    if base_url:
+        # A local Bot API server, e.g. benchmarks/fake_api.py for load tests.
+        builder = builder.base_url(base_url)
+    # Bot API calls are timed per method; 256 matches the builder's default connection pool.
+    builder = builder.request(metrics.InstrumentedRequest(connection_pool_size=256))
+    # Different users' updates run in parallel; each user's (and each group's) stay in order.
+    update_processor = KeyedUpdateProcessor(workers=getattr(config, 'UPDATE_WORKERS', 64))
+    builder = builder.concurrent_updates(update_processor)
+    run_mode = getattr(config, 'RUN_MODE', 'polling')
+    if run_mode == 'webhook':
+        # Bounded so a burst of webhook deliveries is pushed back to Telegram instead of piling up in memory.
+        builder = builder.update_queue(asyncio.Queue(maxsize=webhook.queue_size()))
     application = builder.build()
 
     # --- Setup Conversation Handlers for multi-step interactions ---
@@ -149,6 +192,7 @@ def main() -> None:
     application.add_handler(CommandHandler("tasks", handlers.tasks))
     application.add_handler(CommandHandler("help", handlers.start)) # Alias for start
     application.add_handler(CommandHandler("cancel", handlers.cancel_conversation))
+    application.add_handler(CommandHandler("slowqueries", handlers.admin_slow_queries))
 
     # This general button handler processes all callbacks that are NOT entry points for conversations
     application.add_handler(CallbackQueryHandler(handlers.button_handler))
@@ -158,16 +202,32 @@ def main() -> None:
     application.add_handler(MessageHandler(filters.FORWARDED & filters.ChatType.PRIVATE, handlers.handle_report_forward))
 
 
+    # --- Instrumentation ---
+    slow_query_ms = getattr(config, 'SLOW_QUERY_MS', None)
+    if slow_query_ms is not None: db.enable_query_profiling(slow_query_ms)
+    metrics.instrument_handlers(application)
+    metrics.instrument_module(db)
+    metrics.cache_metrics({'users': db.user_cache, 'claim_filters': db.claim_filters, 'channels': chats.channel_cache, 'members': chats.member_cache})
+    metrics.update_processor_metrics(update_processor)
+
     # --- Schedule Jobs ---
     job_queue = application.job_queue
-    job_queue.run_daily(jobs.daily_credit_reset, time=jobs.time(0, 0), name="daily_reset")
     job_queue.run_daily(jobs.weekly_leaderboard_reset, time=jobs.time(0, 0), days=(0,), name="weekly_reset")
-    job_queue.run_daily(jobs.reset_image_broadcasts, time=jobs.time(0, 0), name="daily_image_broadcast_reset")
+    flag_refresh_interval = getattr(config, 'FEATURE_FLAG_REFRESH_SECONDS', 300)
+    if flag_refresh_interval:
+        job_queue.run_repeating(jobs.refresh_feature_flags, interval=flag_refresh_interval, name="feature_flag_refresh")
+    compaction_interval = getattr(config, 'COMPACTION_INTERVAL_SECONDS', 3600)
+    if compaction_interval:
+        job_queue.run_repeating(jobs.compact_database, interval=compaction_interval, first=60, name="compaction")
 
 
     # --- Start the Bot ---
-    logger.info("Starting bot polling...")
-    application.run_polling()
+    if run_mode == 'webhook':
+        logger.info("Starting bot webhook server...")
+        asyncio.run(webhook.run(application))
+    else:
+        logger.info("Starting bot polling...")
+        application.run_polling()
 
 
 if __name__ == "__main__":
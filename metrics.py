@@ -0,0 +1,237 @@
+# metrics.py
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Handlers, public database.py functions and every Bot API request (except the
+getUpdates long poll) are timed into histograms, with error counters and
+in-flight gauges next to them. Broadcast sends are counted by outcome, and
+cache and update-queue statistics are read from their owners at scrape time.
+Recording an observation is a few dict operations, so this stays on in
+production; main.py installs the instrumentation and, unless METRICS_PORT is
+0, serves GET /metrics on METRICS_HOST:METRICS_PORT.
+"""
+import bisect
+import functools
+import inspect
+import logging
+import time
+
+from telegram.error import NetworkError
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from httpserver import HTTPServer, Response
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    """A named family of samples keyed by label values. `collect()`, if given, supplies them at scrape time."""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self._values = {}
+        registry.append(self)
+
+    def _labels(self, labels, extra=()):
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def _items(self):
+        if not self.collect: return self._values.items()
+        try: return self.collect().items()
+        except Exception:
+            logger.exception(f"Collecting metric {self.name} failed")
+            return ()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{self._labels(labels)} {value}" for labels, value in self._items()]
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, labels=(), value=0):
+        self._values[labels] = value
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        state = self._values.get(labels)
+        if state is None: state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+# --- Instrumentation points ---
+handler_seconds = Histogram('bot_handler_seconds', 'Time spent in update handlers.', ['handler'])
+handler_errors = Counter('bot_handler_errors_total', 'Update handlers that raised.', ['handler'])
+handlers_in_flight = Gauge('bot_handlers_in_flight', 'Update handlers currently running.', ['handler'])
+db_seconds = Histogram('bot_db_seconds', 'Time spent in database.py functions.', ['function'])
+db_errors = Counter('bot_db_errors_total', 'database.py calls that raised.', ['function'])
+db_in_flight = Gauge('bot_db_in_flight', 'database.py calls currently running.', ['function'])
+api_seconds = Histogram('bot_api_seconds', 'Bot API request latency.', ['method'])
+api_errors = Counter('bot_api_errors_total', 'Bot API requests that failed, by HTTP status or "network".', ['method', 'status'])
+api_in_flight = Gauge('bot_api_in_flight', 'Bot API requests currently in flight.', ['method'])
+broadcast_messages = Counter('bot_broadcast_messages_total', 'Messages fanned out by run_broadcast, by outcome.', ['outcome'])
+broadcast_throttled = Counter('bot_broadcast_throttled_total', 'RetryAfter responses received while fanning out.')
+outbox_job = Gauge('bot_outbox_job', 'Progress of the broadcast job the outbox worker is draining.', ['field'])
+
+
+def _timed(histogram, errors, in_flight, name, passthrough=()):
+    labels = (name,)
+
+    def decorate(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            in_flight.inc(labels)
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            except passthrough:
+                raise
+            except Exception:
+                errors.inc(labels)
+                raise
+            finally:
+                histogram.observe(labels, time.perf_counter() - started)
+                in_flight.dec(labels)
+        return wrapper
+    return decorate
+
+
+def instrument_handlers(application):
+    """Wraps the callback of every handler registered on `application`, including inside ConversationHandlers."""
+    seen = set()
+
+    def wrap(handler):
+        if id(handler) in seen: return
+        seen.add(id(handler))
+        if isinstance(handler, ConversationHandler):
+            for state_handlers in handler.states.values():
+                for inner in state_handlers: wrap(inner)
+            for inner in handler.entry_points + handler.fallbacks: wrap(inner)
+            return
+        callback = handler.callback
+        handler.callback = _timed(handler_seconds, handler_errors, handlers_in_flight, callback.__qualname__,
+                                  passthrough=(ApplicationHandlerStop,))(callback)
+
+    for group_handlers in application.handlers.values():
+        for handler in group_handlers: wrap(handler)
+
+
+def instrument_module(module):
+    """Replaces the public coroutine functions defined in `module` with timed wrappers."""
+    for name, function in list(vars(module).items()):
+        if name.startswith('_') or not inspect.iscoroutinefunction(function) or function.__module__ != module.__name__: continue
+        setattr(module, name, _timed(db_seconds, db_errors, db_in_flight, name)(function))
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times every Bot API call by method name."""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        labels = (url.rsplit('/', 1)[-1],)
+        api_in_flight.inc(labels)
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except NetworkError:
+            api_errors.inc(labels + ('network',))
+            raise
+        finally:
+            api_seconds.observe(labels, time.perf_counter() - started)
+            api_in_flight.dec(labels)
+        if code >= 400: api_errors.inc(labels + (str(code),))
+        return code, payload
+
+
+def cache_metrics(caches):
+    """Registers scrape-time hit/miss/size metrics for `caches`, a {name: TTLCache} dict."""
+    stat = lambda key: lambda: {(name,): cache.stats()[key] for name, cache in caches.items()}
+    Counter('bot_cache_hits_total', 'Cache lookups that found a live entry.', ['cache'], collect=stat('hits'))
+    Counter('bot_cache_misses_total', 'Cache lookups that missed.', ['cache'], collect=stat('misses'))
+    Gauge('bot_cache_hit_ratio', 'Share of cache lookups that hit since startup.', ['cache'], collect=stat('hit_rate'))
+    Gauge('bot_cache_entries', 'Entries currently cached.', ['cache'], collect=stat('size'))
+
+
+def update_processor_metrics(processor):
+    """Registers scrape-time queue-depth metrics for a KeyedUpdateProcessor."""
+    stat = lambda key: lambda: {(): processor.stats()[key]}
+    Gauge('bot_updates_waiting', 'Updates admitted and waiting for their user/chat or a worker.', collect=stat('waiting'))
+    Gauge('bot_updates_running', 'Updates being handled right now.', collect=stat('running'))
+    Gauge('bot_updates_waiting_max', 'Largest number of waiting updates seen.', collect=stat('max_waiting'))
+    Counter('bot_updates_processed_total', 'Updates handled.', collect=stat('processed'))
+
+
+def render() -> str:
+    lines = []
+    for metric in registry: lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+async def _handle(request):
+    if request.path != '/metrics': return Response(404)
+    if request.method != 'GET': return Response(405)
+    return Response(200, render(), content_type=CONTENT_TYPE)
+
+
+server = None
+
+
+async def start_server(host='127.0.0.1', port=9464):
+    global server
+    server = HTTPServer(_handle, host, port)
+    await server.start()
+    logger.info(f"Metrics served on http://{host}:{server.port}/metrics.")
+
+
+async def stop_server():
+    global server
+    if server: await server.stop()
+    server = None
@@ -0,0 +1,186 @@
+# migrations.py
+"""
+Versioned schema migrations for the bot's SQLite database.
+
+The schema version is stored in PRAGMA user_version. Each entry of MIGRATIONS
+brings the database from version N to N + 1 and is applied inside its own
+transaction together with the version bump, so a failed migration leaves the
+database exactly as it was. A database that is already current only costs a
+single PRAGMA read at startup.
+
+Never edit a migration that has shipped; append a new one instead.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = [
+    # 1: Baseline schema. IF NOT EXISTS lets it adopt databases created before versioning.
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            credits INTEGER DEFAULT 5,
+            referral_credits INTEGER DEFAULT 0,
+            inviter_id INTEGER,
+            is_premium BOOLEAN DEFAULT FALSE,
+            premium_expiry DATE,
+            is_banned BOOLEAN DEFAULT FALSE,
+            daily_promo_runs INTEGER DEFAULT 2,
+            image_broadcasts_left INTEGER DEFAULT 100,
+            normal_promo_text TEXT,
+            normal_promo_url TEXT,
+            force_join_channel_id INTEGER,
+            clicks_received INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS groups (
+            group_id INTEGER PRIMARY KEY,
+            added_by_user_id INTEGER,
+            is_admin BOOLEAN DEFAULT FALSE,
+            UNIQUE(group_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS promotions (
+            promo_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            promoter_user_id INTEGER,
+            promo_type TEXT,
+            channel_id INTEGER,
+            promo_text TEXT,
+            promo_url TEXT,
+            budget INTEGER DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS claimed_promos (
+            user_id INTEGER,
+            promo_id INTEGER,
+            PRIMARY KEY (user_id, promo_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS feature_flags (
+            name TEXT PRIMARY KEY,
+            is_enabled BOOLEAN DEFAULT TRUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS weekly_clicks (
+            week INTEGER,
+            user_id INTEGER,
+            clicks INTEGER DEFAULT 0,
+            PRIMARY KEY (week, user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_weekly_clicks_rank ON weekly_clicks (week, clicks DESC)',
+        '''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+        ''',
+        "INSERT OR IGNORE INTO bot_state (key, value) VALUES ('leaderboard_week', 1)",
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT,
+            owner_id INTEGER,
+            from_chat_id INTEGER,
+            message_id INTEGER,
+            photo_id TEXT,
+            caption TEXT,
+            cost INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'queued',
+            cursor INTEGER DEFAULT 0,
+            total INTEGER DEFAULT 0,
+            sent INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            blocked INTEGER DEFAULT 0,
+            status_chat_id INTEGER,
+            status_message_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS broadcast_recipients (
+            job_id INTEGER,
+            user_id INTEGER,
+            status INTEGER DEFAULT 0,
+            PRIMARY KEY (job_id, user_id)
+        )
+        ''',
+        "INSERT OR IGNORE INTO feature_flags (name) VALUES ('group_promotion')",
+        "INSERT OR IGNORE INTO feature_flags (name) VALUES ('force_join_promotion')",
+        "INSERT OR IGNORE INTO feature_flags (name) VALUES ('premium_image_caption')",
+    ),
+    # 2: Indexes behind get_all_user_ids / get_random_users_for_broadcast, get_random_groups,
+    # the task index load and get_random_promotion's anti-join.
+    (
+        'CREATE INDEX IF NOT EXISTS idx_users_banned ON users (is_banned)',
+        'CREATE INDEX IF NOT EXISTS idx_groups_admin ON groups (is_admin)',
+        'CREATE INDEX IF NOT EXISTS idx_promotions_budget ON promotions (budget, promoter_user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_claimed_promos_promo ON claimed_promos (promo_id)',
+        'ANALYZE',
+    ),
+    # 3: Per-user quota day for the lazy daily reset. Days are date.toordinal() of the UTC date;
+    # existing users are stamped with today, whose reset the old midnight job already applied.
+    # No default: a row inserted without a day is NULL, which the rollover treats as today.
+    (
+        'ALTER TABLE users ADD COLUMN quota_day INTEGER',
+        "UPDATE users SET quota_day = CAST(julianday('now') - 1721424.5 AS INTEGER)",
+    ),
+    # 4: Premium expiry lookups for the expiry scheduler; only premium users have an expiry.
+    (
+        'CREATE INDEX IF NOT EXISTS idx_users_premium_expiry ON users (premium_expiry) WHERE premium_expiry IS NOT NULL',
+    ),
+    # 5: Archive tables the compaction job moves exhausted promotions and their claims into.
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS archived_promotions (
+            promo_id INTEGER PRIMARY KEY,
+            promoter_user_id INTEGER,
+            promo_type TEXT,
+            channel_id INTEGER,
+            promo_text TEXT,
+            promo_url TEXT,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS archived_claims (
+            user_id INTEGER,
+            promo_id INTEGER,
+            PRIMARY KEY (promo_id, user_id)
+        ) WITHOUT ROWID
+        ''',
+    ),
+    # 6: Invite links the bot created for force-join channels without a public or primary link,
+    # kept so a restart reuses them instead of creating another.
+    (
+        'CREATE TABLE IF NOT EXISTS channel_invite_links (channel_id INTEGER PRIMARY KEY, invite_link TEXT)',
+    ),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def apply_migrations(db) -> int:
+    """Brings the database on connection `db` up to SCHEMA_VERSION. Returns the version."""
+    cursor = await db.execute('PRAGMA user_version')
+    version = (await cursor.fetchone())[0]
+    if version >= SCHEMA_VERSION: return version
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        await db.execute('BEGIN')
+        try:
+            for statement in statements: await db.execute(statement)
+            await db.execute(f'PRAGMA user_version = {number}')
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            logger.exception(f"Database migration {number} failed; schema left at version {number - 1}.")
+            raise
+        logger.info(f"Applied database migration {number}.")
+    return SCHEMA_VERSION
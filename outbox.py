@@ -0,0 +1,140 @@
+# outbox.py
+"""
+Durable broadcast outbox and the background worker that drains it.
+
+A broadcast is stored as a broadcast_jobs row plus one broadcast_recipients row
+per target. The worker sends to each job's recipients in user_id order, one
+batch at a time, and checkpoints every batch (recipient statuses, totals and
+the job cursor) in a single transaction. Active jobs take turns, one batch
+each, so a premium user's small broadcast starts within a few seconds even
+while a large admin broadcast is draining. After a restart it resumes from the last
+checkpoint, so at most one batch is ever sent twice. Admins pause, resume and
+cancel jobs by changing their status, which the worker re-reads between batches.
+"""
+import asyncio
+import logging
+import time
+
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+
+import broadcast
+import database as db
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+STOP_TIMEOUT = 30  # seconds to let the current batch finish on shutdown
+
+# Job status transitions an admin can request: action -> (new status, allowed current statuses)
+ACTIONS = {
+    'pause': ('paused', ('queued', 'running')),
+    'resume': ('queued', ('paused',)),
+    'cancel': ('cancelling', ('queued', 'running', 'paused')),
+}
+
+
+def format_job(job) -> str:
+    """One-paragraph summary of a job, used for progress, reports and the admin list."""
+    processed = job['sent'] + job['failed'] + job['blocked']
+    title = {'copy': "🚀 Broadcast", 'photo': "📸 Image Broadcast"}.get(job['kind'], "Broadcast")
+    text = (f"**{title} #{job['job_id']}** — {job['status']}\n"
+            f"{processed}/{job['total']} processed | ✅ Sent: `{job['sent']}` | ❌ Failed: `{job['failed']}`")
+    if job['kind'] == 'copy': text += f" | 🚫 Banned: `{job['blocked']}`"
+    else: text += f" | 🚫 Blocked: `{job['blocked']}`"
+    return text
+
+
+def sharing_note(active_jobs) -> str:
+    """Tells the owner of a new job how many other broadcasts it takes turns with, if any."""
+    others = len(active_jobs) - 1
+    if others <= 0: return ""
+    return f"\n⏳ Taking turns with {others} other broadcast{'s' if others > 1 else ''}, {BATCH_SIZE} messages at a time."
+
+
+class OutboxWorker:
+    """Drains queued broadcast jobs in the background, taking turns between them batch by batch."""
+
+    def __init__(self):
+        self.bot = None
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._reported_at = {}  # job_id -> monotonic time of its last progress report
+
+    def start(self, bot):
+        """Starts draining; jobs left running by a previous process resume from their cursor."""
+        self.bot, self._stopping = bot, False
+        self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Tells the worker a job was queued or changed status."""
+        self._wakeup.set()
+
+    async def stop(self):
+        """Lets the current batch finish and checkpoint, then stops the worker."""
+        if not self._task: return
+        self._stopping = True
+        self._wakeup.set()
+        try: await asyncio.wait_for(self._task, STOP_TIMEOUT)
+        except asyncio.TimeoutError: logger.warning("Outbox worker did not stop in time; its last batch will be resent.")
+        self._task = None
+
+    async def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            jobs = await db.get_active_broadcast_jobs()
+            if not jobs:
+                await self._wakeup.wait()
+                continue
+            # One batch per job per pass, so a small broadcast never waits for a large one to finish.
+            for job in jobs:
+                if self._stopping: break
+                try: await self._step(job['job_id'])
+                except Exception:
+                    logger.exception(f"Broadcast job {job['job_id']} failed, retrying shortly.")
+                    await asyncio.sleep(5)
+                    break
+
+    def _sender(self, job):
+        if job['kind'] == 'photo':
+            return lambda user_id: self.bot.send_photo(user_id, job['photo_id'], caption=job['caption'])
+        return lambda user_id: self.bot.copy_message(user_id, job['from_chat_id'], job['message_id'])
+
+    async def _step(self, job_id):
+        """Sends and checkpoints the job's next batch, or settles the job if nothing is left."""
+        job = await db.get_broadcast_job(job_id)
+        for field in ('job_id', 'total', 'sent', 'failed', 'blocked'): metrics.outbox_job.set((field,), job[field])
+        if job['status'] == 'paused': return
+        if job['status'] == 'cancelling': await self._settle(job_id, 'cancelled'); return
+        if job['status'] == 'queued': await db.set_broadcast_job_status(job_id, 'running', ('queued',))
+        batch = await db.get_broadcast_batch(job_id, job['cursor'], BATCH_SIZE)
+        if not batch: await self._settle(job_id, 'done'); return
+        result = await broadcast.run_broadcast(batch, self._sender(job))
+        failed, blocked = set(result.failed_ids), set(result.blocked)
+        outcomes = [(db.RECIPIENT_BLOCKED if user_id in blocked else db.RECIPIENT_FAILED if user_id in failed else db.RECIPIENT_SENT, user_id)
+                    for user_id in batch]
+        await db.checkpoint_broadcast(job_id, batch[-1], outcomes, ban_blocked=job['kind'] == 'copy')
+        reported_at = self._reported_at.setdefault(job_id, time.monotonic())
+        if time.monotonic() - reported_at >= broadcast.PROGRESS_INTERVAL:
+            self._reported_at[job_id] = time.monotonic()
+            await self._report(await db.get_broadcast_job(job_id))
+
+    async def _settle(self, job_id, status):
+        job = await db.settle_broadcast_job(job_id, status)
+        self._reported_at.pop(job_id, None)
+        metrics.outbox_job.set(('job_id',), 0)
+        logger.info(f"Broadcast job {job_id} {status}: {job['sent']} sent, {job['failed']} failed, {job['blocked']} blocked.")
+        await self._report(job)
+        if job['status_chat_id']:
+            try: await self.bot.send_message(job['status_chat_id'], format_job(job), parse_mode=ParseMode.MARKDOWN)
+            except TelegramError as e: logger.warning(f"Could not send report for broadcast job {job_id}: {e}")
+
+    async def _report(self, job):
+        if not job['status_chat_id']: return
+        try: await self.bot.edit_message_text(format_job(job), chat_id=job['status_chat_id'], message_id=job['status_message_id'], parse_mode=ParseMode.MARKDOWN)
+        except TelegramError as e: logger.warning(f"Could not update progress of broadcast job {job['job_id']}: {e}")
+
+
+worker = OutboxWorker()
@@ -0,0 +1,110 @@
+# pool.py
+"""
+Long-lived SQLite connections shared by the whole bot.
+
+aiosqlite runs every connection on its own worker thread, so opening one per
+query costs a thread spawn and a file open. The pool instead keeps a single
+writer connection, held exclusively for the duration of a transaction, and a
+small set of read-only connections that WAL mode lets run alongside it.
+With a `profiler` set before open(), every pooled connection reports its
+statements to it (see querylog.py).
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from querylog import ProfiledConnection
+
+logger = logging.getLogger(__name__)
+
+# Applied to every pooled connection right after it is opened. auto_vacuum has to
+# come before journal_mode: switching to WAL writes the header of a new file, after
+# which auto_vacuum only changes with a full VACUUM.
+PRAGMAS = (
+    'PRAGMA auto_vacuum = INCREMENTAL',
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+)
+# Number of compiled statements sqlite3 keeps per connection.
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """One writer connection plus a fixed number of reader connections."""
+
+    def __init__(self, path, readers=4):
+        self.path = path
+        self.size = readers
+        self._writer = None
+        self._readers = None
+        self._write_lock = asyncio.Lock()
+        self.profiler = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only=False):
+        conn = await aiosqlite.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute('PRAGMA query_only = ON')
+        return ProfiledConnection(conn, self.profiler) if self.profiler else conn
+
+    async def open(self):
+        """Opens the writer and reader connections. Safe to call twice."""
+        if self.is_open: return
+        self._writer = await self._connect()
+        self._readers = asyncio.Queue()
+        for _ in range(self.size):
+            self._readers.put_nowait(await self._connect(read_only=True))
+        logger.info(f"Database pool opened on {self.path} with {self.size} readers.")
+
+    async def close(self):
+        """Waits for in-flight work to finish, then closes every connection."""
+        if not self.is_open: return
+        async with self._write_lock:
+            for _ in range(self.size):
+                await (await self._readers.get()).close()
+            await self._writer.execute('PRAGMA optimize')
+            await self._writer.close()
+            self._writer, self._readers = None, None
+        logger.info("Database pool closed.")
+
+    @asynccontextmanager
+    async def writer(self):
+        """
+        Yields the writer connection, held exclusively until the block exits.
+        A transaction left open by the block is rolled back so it can never
+        leak into the next caller.
+        """
+        if not self.is_open:
+            async with aiosqlite.connect(self.path) as conn:
+                yield conn
+            return
+        async with self._write_lock:
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+
+    @asynccontextmanager
+    async def reader(self):
+        """Yields a read-only connection borrowed from the pool."""
+        if not self.is_open:
+            async with aiosqlite.connect(self.path) as conn:
+                yield conn
+            return
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
@@ -0,0 +1,103 @@
+# querylog.py
+"""
+Opt-in statement profiler for the SQLite connection pool.
+
+When enabled, every connection the pool opens is wrapped so each execute and
+executemany is timed (up to the first row) and aggregated per statement text.
+Statements slower than the threshold are logged with their parameters. The
+first time a statement is slow, its EXPLAIN QUERY PLAN is captured on the same
+connection, and plan steps that scan a whole table without an index are
+flagged. top() lists the statements that cost the most in total.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENTS = 1000  # distinct statements tracked
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+def normalize(sql) -> str:
+    return ' '.join(sql.split())
+
+
+def is_full_scan(detail) -> bool:
+    """True for a plan step that reads a whole table rather than an index."""
+    return detail.startswith('SCAN ') and 'INDEX' not in detail and 'CONSTANT ROW' not in detail
+
+
+class StatementStats:
+    __slots__ = ('sql', 'calls', 'total', 'max', 'slow', 'plan', 'full_scans')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.plan = None  # EXPLAIN QUERY PLAN details, captured on the first slow run
+        self.full_scans = []
+
+
+class QueryProfiler:
+    """Per-statement timings plus a slow-query log; `threshold` is in seconds."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.stats = {}
+
+    async def observe(self, conn, sql, parameters, seconds):
+        key = normalize(sql)
+        entry = self.stats.get(key)
+        if entry is None:
+            if len(self.stats) >= MAX_STATEMENTS: return
+            entry = self.stats[key] = StatementStats(key)
+        entry.calls += 1
+        entry.total += seconds
+        entry.max = max(entry.max, seconds)
+        if seconds < self.threshold: return
+        entry.slow += 1
+        logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {key} | params: {parameters!r:.200}")
+        if entry.plan is None and key.split(' ', 1)[0].upper() in EXPLAINABLE:
+            entry.plan = await self._explain(conn, sql, parameters)
+            entry.full_scans = [detail for detail in entry.plan if is_full_scan(detail)]
+            logger.warning(f"Query plan for {key[:80]}: {' | '.join(entry.plan)}")
+            if entry.full_scans: logger.warning(f"Full table scan in {key[:80]}: {', '.join(entry.full_scans)}")
+
+    @staticmethod
+    async def _explain(conn, sql, parameters):
+        try:
+            cursor = await conn.execute(f'EXPLAIN QUERY PLAN {sql}', parameters or ())
+            return [row[3] for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.warning(f"Could not explain {normalize(sql)[:80]}: {e}")
+            return []
+
+    def top(self, limit=10):
+        """The `limit` statements with the highest total time."""
+        return sorted(self.stats.values(), key=lambda entry: entry.total, reverse=True)[:limit]
+
+
+class ProfiledConnection:
+    """aiosqlite connection proxy that reports every statement to a QueryProfiler."""
+
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def execute(self, sql, parameters=None):
+        started = time.perf_counter()
+        cursor = await self._conn.execute(sql, parameters)
+        await self._profiler.observe(self._conn, sql, parameters, time.perf_counter() - started)
+        return cursor
+
+    async def executemany(self, sql, parameters):
+        parameters = list(parameters)
+        started = time.perf_counter()
+        cursor = await self._conn.executemany(sql, parameters)
+        await self._profiler.observe(self._conn, sql, parameters[0] if parameters else None, time.perf_counter() - started)
+        return cursor
@@ -0,0 +1,54 @@
+# sampler.py
+"""
+In-memory sets of ids that random targets are drawn from.
+
+Broadcast recipients and group shares need a handful of uniformly random ids
+out of a table that may hold millions. Sorting the whole table by RANDOM() for
+that costs O(N log N) per request; an IdSampler keeps the eligible ids in a
+flat list with a position map instead, so adding or dropping an id is O(1) and
+a sample of k ids costs O(k) regardless of the table size.
+"""
+import random
+
+
+class IdSampler:
+    """Set of ids supporting O(1) add/discard and uniform sampling."""
+
+    def __init__(self):
+        self.loaded = False
+        self._ids = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    def load(self, ids):
+        """Replaces the set with `ids`."""
+        self._ids, self._positions = [], {}
+        for item_id in ids: self.add(item_id)
+        self.loaded = True
+
+    def add(self, item_id):
+        if item_id in self._positions: return
+        self._positions[item_id] = len(self._ids)
+        self._ids.append(item_id)
+
+    def discard(self, item_id):
+        """Removes an id by swapping the last id into its slot."""
+        position = self._positions.pop(item_id, None)
+        if position is None: return
+        last = self._ids.pop()
+        if position < len(self._ids):
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def sample(self, k, exclude=()):
+        """Returns up to `k` distinct ids chosen uniformly at random, skipping those in `exclude`."""
+        exclude = [item_id for item_id in exclude if item_id in self._positions]
+        # Drawing len(exclude) extra ids and filtering keeps the sample uniform over the rest.
+        chosen = random.sample(self._ids, min(len(self._ids), k + len(exclude)))
+        if exclude: chosen = [item_id for item_id in chosen if item_id not in exclude]
+        return chosen[:k]
@@ -0,0 +1,82 @@
+# task_index.py
+"""
+In-memory index of the promotions that can still be handed out as tasks.
+
+Live promotions (budget > 0) are kept in a flat list with a position map, so
+picking one uniformly and dropping an exhausted one are both O(1). The set of
+promotions each recently active user has already claimed is loaded lazily from
+claimed_promos and kept in a bounded LRU, so selection never touches SQLite.
+"""
+import random
+from collections import OrderedDict
+
+# Random probes made before falling back to filtering the whole live set.
+MAX_PROBES = 16
+
+
+class TaskIndex:
+    """Live promotions plus per-user claim sets, maintained incrementally."""
+
+    def __init__(self, max_users=50000):
+        self.loaded = False
+        self.max_users = max_users
+        self._promos = []
+        self._positions = {}
+        self._claims = OrderedDict()
+
+    def __len__(self):
+        return len(self._promos)
+
+    def load(self, rows):
+        """Replaces the live set with `rows`, as returned by the promotions query."""
+        self._promos, self._positions = [], {}
+        for row in rows: self.add(row)
+        self.loaded = True
+
+    def add(self, row):
+        """Adds a promotion row (promo_id, promoter_user_id, promo_type, channel_id, promo_text, promo_url)."""
+        if row[0] in self._positions: return
+        self._positions[row[0]] = len(self._promos)
+        self._promos.append(tuple(row))
+
+    def discard(self, promo_id):
+        """Removes an exhausted promotion by swapping the last row into its slot."""
+        position = self._positions.pop(promo_id, None)
+        if position is None: return
+        last = self._promos.pop()
+        if position < len(self._promos):
+            self._promos[position] = last
+            self._positions[last[0]] = position
+
+    def has_claims(self, user_id) -> bool:
+        """True if the user's claim set is loaded; marks it as recently used."""
+        if user_id not in self._claims: return False
+        self._claims.move_to_end(user_id)
+        return True
+
+    def set_claims(self, user_id, promo_ids):
+        self._claims[user_id] = set(promo_ids)
+        self._claims.move_to_end(user_id)
+        while len(self._claims) > self.max_users:
+            self._claims.popitem(last=False)
+
+    def mark_claimed(self, user_id, promo_id):
+        """Records a claim. Users whose set is not loaded will read it from the DB."""
+        claimed = self._claims.get(user_id)
+        if claimed is not None: claimed.add(promo_id)
+
+    def pick(self, user_id):
+        """
+        Returns a uniformly chosen live promotion the user neither owns nor has
+        claimed, or None. Rejection sampling keeps the common case O(1); users
+        who have claimed most of the live set fall back to a linear filter.
+        """
+        claimed = self._claims.get(user_id, ())
+        eligible = lambda row: row[1] != user_id and row[0] not in claimed
+        count = len(self._promos)
+        if not count: return None
+        for _ in range(min(MAX_PROBES, count)):
+            row = self._promos[random.randrange(count)]
+            if eligible(row): return row
+        candidates = [row for row in self._promos if eligible(row)]
+        return random.choice(candidates) if candidates else None
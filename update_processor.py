@@ -0,0 +1,89 @@
+# update_processor.py
+"""
+Concurrent update processing with per-user and per-chat ordering.
+
+With python-telegram-bot's default sequential processing, one slow handler
+holds up every other user. KeyedUpdateProcessor lets updates run concurrently
+but never runs two updates for the same user at once, nor two updates from the
+same group chat. A user's updates are therefore handled in arrival order, and
+the read-modify-write sequences in the conversation handlers stay safe, as
+does ConversationHandler's per-user state. Updates with neither a user nor a
+chat run without restriction.
+
+Updates waiting on their key do not take a worker slot: at most `workers`
+handlers run at a time, and up to `max_concurrent_updates` updates may be
+admitted (waiting or running) before the Application stops feeding more.
+"""
+import asyncio
+
+from telegram.constants import ChatType
+from telegram.ext import BaseUpdateProcessor
+
+
+def update_keys(update):
+    """Serialization keys for an update, in a fixed order so locks are always taken consistently."""
+    keys = []
+    if update.effective_user: keys.append(('user', update.effective_user.id))
+    chat = update.effective_chat
+    if chat and chat.type != ChatType.PRIVATE: keys.append(('chat', chat.id))
+    return keys
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to `workers` updates at once, one at a time per user and per group chat."""
+
+    def __init__(self, workers=64, max_concurrent_updates=None):
+        super().__init__(max_concurrent_updates or workers * 16)
+        self._workers = asyncio.Semaphore(workers)
+        self._keys = {}  # key -> [lock, updates holding or waiting for it]
+        self.waiting = 0  # admitted updates waiting for their key or a worker
+        self.running = 0
+        self.max_waiting = 0
+        self.processed = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _acquire_entry(self, key):
+        entry = self._keys.get(key)
+        if entry is None: entry = self._keys[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        return entry
+
+    def _release_entry(self, key):
+        entry = self._keys[key]
+        entry[1] -= 1
+        if not entry[1]: del self._keys[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        keys = update_keys(update) if hasattr(update, 'effective_user') else []
+        entries = [self._acquire_entry(key) for key in keys]
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        acquired, started = [], False
+        try:
+            for lock, _ in entries:
+                await lock.acquire()
+                acquired.append(lock)
+            async with self._workers:
+                self.waiting -= 1
+                self.running += 1
+                started = True
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.waiting -= 1
+                coroutine.close()  # Cancelled while waiting; the handler never ran.
+            for lock in acquired: lock.release()
+            for key in keys: self._release_entry(key)
+
+    def stats(self) -> dict:
+        return {'waiting': self.waiting, 'running': self.running, 'max_waiting': self.max_waiting,
+                'processed': self.processed, 'active_keys': len(self._keys)}
@@ -0,0 +1,106 @@
+# webhook.py
+"""
+Webhook run mode: Telegram pushes updates to a local HTTP endpoint.
+
+Selected with config.RUN_MODE = 'webhook'. Updates POSTed to WEBHOOK_PATH are
+checked against the X-Telegram-Bot-Api-Secret-Token header, decoded and put on
+the Application's update queue. The queue is bounded (WEBHOOK_QUEUE_SIZE);
+when it is full the request is answered with 503 and Telegram redelivers the
+update later, so a burst cannot grow memory without limit.
+
+On SIGINT/SIGTERM the server stops accepting requests, finishes those in
+flight, and the Application processes every update already queued before the
+usual post_shutdown cleanup runs. The webhook registration is left in place,
+so Telegram holds new updates until the bot is back.
+
+If WEBHOOK_URL is set, the webhook is registered with Telegram at startup.
+Without it the server only listens, which is handy for local testing:
+
+    curl -H 'X-Telegram-Bot-Api-Secret-Token: <secret>' -d @update.json http://127.0.0.1:8443/telegram
+"""
+import asyncio
+import hmac
+import json
+import logging
+import signal
+
+from telegram import Update
+
+import config
+from httpserver import HTTPServer, Response
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+DEFAULT_QUEUE_SIZE = 1000
+
+
+def queue_size() -> int:
+    return getattr(config, 'WEBHOOK_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)
+
+
+class WebhookServer:
+    """HTTP endpoint feeding Telegram updates into an Application's update queue."""
+
+    def __init__(self, application, path='/telegram', secret_token=None, host='127.0.0.1', port=8443):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token.encode() if secret_token else None
+        self.http = HTTPServer(self.handle, host, port)
+        self.rejected = 0  # updates refused because the queue was full
+
+    async def handle(self, request):
+        if request.path != self.path: return Response(404)
+        if request.method != 'POST': return Response(405)
+        if self.secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, '').encode('latin-1'), self.secret_token):
+            return Response(403)
+        try:
+            payload = json.loads(request.body)
+            if not isinstance(payload, dict): return Response(400)  # de_json fails on, or returns None for, anything else
+            update = Update.de_json(payload, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return Response(400)
+        if update is None: return Response(400)
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Update queue full, asking Telegram to redeliver update {update.update_id}.")
+            return Response(503, headers={'Retry-After': '1'})
+        return Response(200)
+
+
+async def run(application):
+    """Runs `application` behind the webhook server until SIGINT/SIGTERM."""
+    server = WebhookServer(application,
+                           path=getattr(config, 'WEBHOOK_PATH', '/telegram'),
+                           secret_token=getattr(config, 'WEBHOOK_SECRET_TOKEN', None),
+                           host=getattr(config, 'WEBHOOK_LISTEN', '127.0.0.1'),
+                           port=getattr(config, 'WEBHOOK_PORT', 8443))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try: loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError: pass  # Windows; Ctrl+C still raises KeyboardInterrupt.
+
+    await application.initialize()
+    try:
+        if application.post_init: await application.post_init(application)
+        await application.start()
+        await server.http.start()
+        try:
+            url = getattr(config, 'WEBHOOK_URL', None)
+            if url:
+                await application.bot.set_webhook(url, secret_token=getattr(config, 'WEBHOOK_SECRET_TOKEN', None),
+                                                  allowed_updates=Update.ALL_TYPES,
+                                                  max_connections=getattr(config, 'WEBHOOK_MAX_CONNECTIONS', 40))
+            logger.info(f"Webhook server listening on {server.http.host}:{server.http.port}{server.path}.")
+            await stop.wait()
+        finally:
+            logger.info("Draining webhook server and queued updates...")
+            await server.http.stop()
+            await application.stop()
+            if application.post_stop: await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown: await application.post_shutdown(application)